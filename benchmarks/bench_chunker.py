@@ -0,0 +1,139 @@
+"""
+Compare sentence splitters: throughput, and how closely chunk and
+sentence boundaries match the full spaCy pipeline.
+
+Pages come from the PDF when it is available, otherwise from the chunk
+texts already in vector_store/ (so it runs offline).
+
+    python -m benchmarks.bench_chunker
+    python -m benchmarks.bench_chunker --pdf data/harrypotter.pdf --pages 300
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+
+from ingestion.chunk_store import STORE_DIR, ChunkStore, store_exists
+from ingestion.chunker import SPLITTERS, chunk_text, clean_text, split_pages
+
+VECTOR_BASE = "vector_store"
+
+
+def pages_from_pdf(path, limit):
+    from ingestion.pdf_loader import load_pdf
+    from ingestion.structure_parser import assign_structure
+
+    pages = assign_structure(load_pdf(path))
+    pages = [p for p in pages if p["book"] and p["chapter"]]
+    return pages[:limit]
+
+
+def pages_from_vector_store(limit):
+    """
+    Treat stored chunk texts as pages, keeping their book/chapter.
+    """
+    pages = []
+    for name in sorted(os.listdir(VECTOR_BASE)):
+        book_path = os.path.join(VECTOR_BASE, name)
+        if store_exists(os.path.join(book_path, STORE_DIR)):
+            items = ChunkStore(os.path.join(book_path, STORE_DIR))
+        elif os.path.exists(os.path.join(book_path, "meta.pkl")):
+            with open(os.path.join(book_path, "meta.pkl"), "rb") as f:
+                items = pickle.load(f)
+        else:
+            continue
+        for c in items:
+            pages.append({"page": len(pages) + 1, "book": c["book"],
+                          "chapter": c["chapter"], "text": c["text"]})
+            if len(pages) >= limit:
+                return pages
+    return pages
+
+
+def sentence_ends(text, sents):
+    """
+    Character offsets in text where each sentence ends.
+    """
+    ends, pos = set(), 0
+    for s in sents:
+        s = s.strip()
+        if not s:
+            continue
+        at = text.find(s, pos)
+        if at < 0:
+            continue
+        pos = at + len(s)
+        ends.add(pos)
+    return ends
+
+
+def f1(found, truth):
+    if not found or not truth:
+        return 0.0
+    hits = len(found & truth)
+    p, r = hits / len(found), hits / len(truth)
+    return 2 * p * r / (p + r) if p + r else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", default=None)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.pdf:
+        pages = pages_from_pdf(args.pdf, args.pages)
+    else:
+        pages = pages_from_vector_store(args.pages)
+    if not pages:
+        raise SystemExit("No input pages (pass --pdf or build vector_store/ first)")
+
+    texts = [clean_text(p["text"]) for p in pages]
+    n_chars = sum(len(t) for t in texts)
+
+    results, baseline_ends, baseline_chunks = [], None, None
+    for splitter in SPLITTERS:
+        t0 = time.perf_counter()
+        sents = list(split_pages(texts, splitter=splitter))
+        split_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        chunks = chunk_text(pages, splitter=splitter)
+        chunk_s = time.perf_counter() - t0
+
+        ends = [sentence_ends(t, s) for t, s in zip(texts, sents)]
+        chunk_texts = {c["text"] for c in chunks}
+        if baseline_ends is None:
+            baseline_ends, baseline_chunks = ends, chunk_texts  # spacy is first
+
+        sent_f1 = sum(f1(e, b) for e, b in zip(ends, baseline_ends)) / len(texts)
+        same_chunks = len(chunk_texts & baseline_chunks) / max(len(baseline_chunks), 1)
+        results.append({
+            "splitter": splitter,
+            "pages_per_s": round(len(texts) / split_s, 1),
+            "mchars_per_s": round(n_chars / split_s / 1e6, 3),
+            "chunk_s": round(chunk_s, 3),
+            "chunks": len(chunks),
+            "sentence_f1": round(sent_f1, 4),
+            "identical_chunks": round(same_chunks, 4),
+        })
+
+    if args.json:
+        print(json.dumps({"pages": len(texts), "results": results}, indent=2))
+        return
+
+    print(f"{len(texts)} pages, {n_chars / 1e6:.2f}M chars (baseline: spacy)")
+    print(f"{'splitter':<13}{'pages/s':>10}{'Mchar/s':>10}{'chunk s':>10}"
+          f"{'chunks':>8}{'sent F1':>9}{'same chunks':>13}")
+    for r in results:
+        print(
+            f"{r['splitter']:<13}{r['pages_per_s']:>10.1f}{r['mchars_per_s']:>10.3f}"
+            f"{r['chunk_s']:>10.3f}{r['chunks']:>8}{r['sentence_f1']:>9.4f}"
+            f"{r['identical_chunks']:>13.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Compare index types against the exact flat baseline.
+
+Vectors come from an existing index in vector_store/ (reconstructed and
+re-normalized), so this runs offline without re-embedding. Queries are
+held-out rows of that index.
+
+    python -m benchmarks.bench_index_types
+    python -m benchmarks.bench_index_types --book harry_potter_and_the_sorcerers_stone --k 12
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import faiss
+import numpy as np
+
+from ingestion.centroids import _folder_vectors
+from ingestion.index_factory import (
+    INDEX_TYPES, index_path, make_index, normalize, read_index, write_index,
+)
+from ingestion.numpy_index import NumpyIndex
+from rag.retriever import search_params
+
+VECTOR_BASE = "vector_store"
+
+
+def load_vectors(book):
+    return normalize(_folder_vectors(index_path(os.path.join(VECTOR_BASE, book))))
+
+
+def first_book():
+    for name in sorted(os.listdir(VECTOR_BASE)):
+        if index_path(os.path.join(VECTOR_BASE, name)) is not None:
+            return name
+    raise SystemExit(f"No index found under {VECTOR_BASE}/")
+
+
+def serialized_bytes(index):
+    """
+    On-disk size of the index (not its resident memory).
+    """
+    if isinstance(index, NumpyIndex):
+        return int(index.vectors.nbytes)
+    return int(faiss.serialize_index(index).size)
+
+
+def _peak_rss_bytes():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _load_and_search(file_path, info, query, k):
+    before = _peak_rss_bytes()
+    index = read_index(file_path)
+    params = search_params(info)
+    if params is None:
+        index.search(query[None, :], k)
+    else:
+        index.search(query[None, :], k, params=params)
+    return _peak_rss_bytes() - before
+
+
+def resident_bytes(index, info, query, k):
+    """
+    Memory the index takes once served: growth of peak RSS across
+    read_index() and one search, measured in a freshly spawned process
+    so memory this one freed after earlier builds can't hide it. For
+    the memory-mapped "numpy" type this counts the pages one scan
+    touches (the whole matrix).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        write_index(index, tmp)
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            return pool.apply(_load_and_search, (index_path(tmp), info, query, k))
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def bench(vectors, queries, k, index_type, nlist=None):
+    t0 = time.perf_counter()
+    index, info = make_index(index_type, vectors, nlist)
+    build_s = time.perf_counter() - t0
+
+    params = search_params(info)
+    latencies, found = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        if params is None:
+            _, ids = index.search(q[None, :], k)
+        else:
+            _, ids = index.search(q[None, :], k, params=params)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found.append(ids[0])
+
+    return {
+        "index_type": index_type,
+        "build_s": round(build_s, 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "serialized_bytes": serialized_bytes(index),
+        "resident_bytes": resident_bytes(index, info, queries[0], k),
+    }, np.array(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--book", default=None)
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    book = args.book or first_book()
+    vectors = load_vectors(book)
+
+    rng = np.random.default_rng(0)
+    pick = rng.choice(len(vectors), size=min(args.queries, len(vectors) // 10), replace=False)
+    queries = vectors[pick]
+    base = np.delete(vectors, pick, axis=0)
+
+    results = []
+    truth = None
+    for index_type in INDEX_TYPES:
+        row, found = bench(base, queries, args.k, index_type, args.nlist)
+        if truth is None:
+            truth = found  # flat is first: exact neighbours
+        row["recall@k"] = round(recall_at_k(found, truth), 4)
+        results.append(row)
+
+    if args.json:
+        print(json.dumps({"book": book, "k": args.k, "results": results}, indent=2))
+        return
+
+    print(f"{book}: {len(base)} vectors, {len(queries)} queries, k={args.k}")
+    print(
+        f"{'type':<8}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}"
+        f"{'disk MB':>10}{'RSS MB':>10}{'build s':>10}"
+    )
+    for r in results:
+        print(
+            f"{r['index_type']:<8}{r['recall@k']:>10.4f}{r['p50_ms']:>10.3f}"
+            f"{r['p95_ms']:>10.3f}{r['serialized_bytes'] / 1e6:>10.2f}"
+            f"{r['resident_bytes'] / 1e6:>10.2f}{r['build_s']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
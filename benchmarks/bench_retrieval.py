@@ -0,0 +1,321 @@
+"""
+Retrieval benchmark and regression check over a golden question set.
+
+Runs every question in golden_questions.jsonl through retrieve_many ->
+filter_chunks_many -> rerank_many (see run_stages) against the existing vector_store/ (no LLM,
+no network) and reports:
+
+- recall against the labelled gold chapters: anywhere in the retrieved
+  candidates, in the filtered set, and in the reranker's top 1/3/top_n
+- per-stage latency percentiles (sequential, caches disabled)
+- QPS of that path one question per call with N concurrent workers,
+  and N questions per call
+- peak RSS of the process
+
+Questions whose gold book has no index in vector_store/ are skipped.
+
+    python -m benchmarks.bench_retrieval                     # report
+    python -m benchmarks.bench_retrieval --save-baseline     # record baseline
+    python -m benchmarks.bench_retrieval --check             # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from common import tracing
+from ingestion.embeddings import query_cache
+from rag.index_registry import VECTOR_BASE, get_registry
+from rag.reranker import RERANK_TOP_M, pair_cache, rerank_many
+from rag.retriever import filter_chunks_many, retrieve_many
+from rag.router import ROUTING_ENABLED, route_stats
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_PATH = os.path.join(HERE, "golden_questions.jsonl")
+BASELINE_PATH = os.path.join(HERE, "retrieval_baseline.json")
+
+STAGES = ("retrieve", "filter_chunks", "rerank", "total")
+# Sub-stages reported from common.tracing spans.
+SPANS = ("embed_query", "faiss_search", "bm25", "rerank_predict")
+
+# Latency changes smaller than this are treated as noise.
+LATENCY_FLOOR_MS = 2.0
+
+
+def _norm_book(name):
+    return name.replace("’", "'").strip().lower()
+
+
+def _norm_chapter(name):
+    return " ".join(name.split()).upper()
+
+
+def load_golden(path=GOLDEN_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def indexed_books():
+    registry = get_registry(VECTOR_BASE)
+    corpus = registry.corpus()
+    if corpus is not None:
+        return {_norm_book(b) for b in corpus.books}
+    return {_norm_book(b.metadata[0]["book"]) for b in registry.books() if len(b.metadata)}
+
+
+def is_gold(chunk, item):
+    return (
+        _norm_book(chunk.get("book", "")) == _norm_book(item["book"])
+        and _norm_chapter(chunk.get("chapter", "")) in {_norm_chapter(c) for c in item["chapters"]}
+    )
+
+
+def disable_caches():
+    """
+    Measure the compute path, not cache hits on repeated questions.
+    """
+    query_cache.maxsize = 0
+    query_cache.cache_dir = None
+    pair_cache.maxsize = 0
+
+
+def run_stages(questions, k_per_book, top_n, route=ROUTING_ENABLED):
+    """
+    retrieve_many -> filter_chunks_many -> rerank_many over questions,
+    with per-stage timings. As in the apps, the reranker scores the
+    unfiltered candidates; the filtered lists (the no-reranker
+    fallback) are only scored for recall. Both the sequential/worker
+    and the batched measurements go through here, so they time the
+    same pipeline.
+    """
+    t0 = time.perf_counter()
+    chunk_lists = retrieve_many(questions, k_per_book, route=route)
+    t1 = time.perf_counter()
+    filtered = filter_chunks_many(questions, chunk_lists)
+    t2 = time.perf_counter()
+    ranked = rerank_many(questions, chunk_lists, top_n, RERANK_TOP_M)
+    t3 = time.perf_counter()
+    timings = {"retrieve": t1 - t0, "filter_chunks": t2 - t1, "rerank": t3 - t2, "total": t3 - t0}
+    return chunk_lists, filtered, ranked, timings
+
+
+def run_question(question, k_per_book, top_n, route=ROUTING_ENABLED):
+    chunk_lists, filtered, ranked, timings = run_stages([question], k_per_book, top_n, route)
+    return chunk_lists[0], filtered[0], ranked[0], timings
+
+
+def percentiles(samples_s):
+    ms = np.asarray(samples_s) * 1000
+    return {
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def bench(golden, k_per_book=12, top_n=5, repeat=3, workers=(1, 4), route=ROUTING_ENABLED,
+          batch_sizes=(16,)):
+    books = indexed_books()
+    items = [g for g in golden if _norm_book(g["book"]) in books]
+    skipped = [g["question"] for g in golden if _norm_book(g["book"]) not in books]
+    if not items:
+        raise SystemExit(f"None of the golden books are indexed in {VECTOR_BASE}/")
+
+    disable_caches()
+    run_question(items[0]["question"], k_per_book, top_n, route)  # load models and indexes
+    tracing.reset()
+
+    # Quality + sequential latency
+    per_stage = {s: [] for s in STAGES}
+    hits = {"retrieved": 0, "filtered": 0, "rerank@1": 0, "rerank@3": 0, f"rerank@{top_n}": 0}
+    questions = []
+    for item in items:
+        for r in range(repeat):
+            chunks, filtered, ranked, timings = run_question(
+                item["question"], k_per_book, top_n, route
+            )
+            for s in STAGES:
+                per_stage[s].append(timings[s])
+            if r:
+                continue
+
+            gold_ranks = [i for i, c in enumerate(ranked, 1) if is_gold(c, item)]
+            found = {
+                "retrieved": any(is_gold(c, item) for c in chunks),
+                "filtered": any(is_gold(c, item) for c in filtered),
+                "rerank@1": bool(gold_ranks) and gold_ranks[0] <= 1,
+                "rerank@3": bool(gold_ranks) and gold_ranks[0] <= 3,
+                f"rerank@{top_n}": bool(gold_ranks),
+            }
+            for key, ok in found.items():
+                hits[key] += ok
+            questions.append({
+                "question": item["question"],
+                "candidates": len(chunks),
+                "filtered": len(filtered),
+                "first_gold_rank": gold_ranks[0] if gold_ranks else None,
+                "top": [f"{c['book']} | {_norm_chapter(c['chapter'])}" for c in ranked[:3]],
+            })
+
+    span_stats = tracing.latency_stats()
+    latency = {s: percentiles(v) for s, v in per_stage.items()}
+    for name in SPANS:
+        if name in span_stats:
+            s = span_stats[name]
+            latency[name] = {k[:-2]: round(s[k] * 1000, 3) for k in ("p50_s", "p95_s", "p99_s")}
+
+    # Throughput
+    throughput = {}
+    jobs = [item["question"] for item in items] * repeat
+    for n in workers:
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            t0 = time.perf_counter()
+            list(pool.map(lambda q: run_question(q, k_per_book, top_n, route), jobs))
+            wall = time.perf_counter() - t0
+        throughput[f"workers={n}"] = round(len(jobs) / wall, 3)
+    for n in batch_sizes:
+        t0 = time.perf_counter()
+        for start in range(0, len(jobs), n):
+            run_stages(jobs[start:start + n], k_per_book, top_n, route)
+        wall = time.perf_counter() - t0
+        throughput[f"batch={n}"] = round(len(jobs) / wall, 3)
+
+    return {
+        "config": {
+            "k_per_book": k_per_book,
+            "top_n": top_n,
+            "repeat": repeat,
+            "layout": "unified" if get_registry(VECTOR_BASE).corpus() is not None else "per-book",
+            "route": route,
+            "questions": len(items),
+            "skipped": skipped,
+        },
+        "recall": {k: round(v / len(items), 4) for k, v in hits.items()},
+        "latency_ms": latency,
+        "qps": throughput,
+        "peak_rss_mb": peak_rss_mb(),
+        "routing": route_stats(),
+        "questions": questions,
+    }
+
+
+def compare(baseline, result, recall_tol=0.0, latency_tol=0.25, rss_tol=0.15):
+    """
+    Regressions of result against baseline, as human-readable lines.
+    """
+    failed = []
+    if baseline.get("config", {}).get("questions") != result["config"]["questions"]:
+        failed.append(
+            f"question set changed ({baseline.get('config', {}).get('questions')} -> "
+            f"{result['config']['questions']}); re-record the baseline"
+        )
+        return failed
+
+    for key, base in baseline.get("recall", {}).items():
+        now = result["recall"].get(key)
+        if now is not None and now < base - recall_tol:
+            failed.append(f"recall {key}: {now:.3f} < baseline {base:.3f}")
+
+    for stage in STAGES:
+        for q in ("p50", "p95"):
+            base = baseline.get("latency_ms", {}).get(stage, {}).get(q)
+            now = result["latency_ms"].get(stage, {}).get(q)
+            if base is None or now is None:
+                continue
+            if now > base * (1 + latency_tol) and now - base > LATENCY_FLOOR_MS:
+                failed.append(f"latency {stage} {q}: {now:.1f}ms > baseline {base:.1f}ms")
+
+    for key, base in baseline.get("qps", {}).items():
+        now = result["qps"].get(key)
+        if now is not None and now < base * (1 - latency_tol):
+            failed.append(f"qps {key}: {now:.2f} < baseline {base:.2f}")
+
+    base = baseline.get("peak_rss_mb")
+    if base and result["peak_rss_mb"] > base * (1 + rss_tol):
+        failed.append(f"peak RSS {result['peak_rss_mb']:.0f}MB > baseline {base:.0f}MB")
+
+    return failed
+
+
+def print_report(result):
+    cfg = result["config"]
+    print(f"{cfg['questions']} questions ({cfg['layout']}, k_per_book={cfg['k_per_book']}, "
+          f"top_n={cfg['top_n']}), {len(cfg['skipped'])} skipped (book not indexed)")
+    print("recall   " + "  ".join(f"{k}={v:.3f}" for k, v in result["recall"].items()))
+    for stage, p in result["latency_ms"].items():
+        print(f"{stage:<14} p50={p['p50']:8.2f}ms  p95={p['p95']:8.2f}ms  p99={p['p99']:8.2f}ms")
+    print("qps      " + "  ".join(f"{k}: {v:.2f}" for k, v in result["qps"].items()))
+    print(f"peak RSS {result['peak_rss_mb']:.0f} MB")
+    print("routing  " + "  ".join(f"{k}={v}" for k, v in result["routing"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--k-per-book", type=int, default=12)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", default="1,4", help="comma-separated worker counts")
+    parser.add_argument(
+        "--batch-sizes", default="16", help="comma-separated retrieve_many batch sizes"
+    )
+    routing = parser.add_mutually_exclusive_group()
+    routing.add_argument("--route", action="store_true", help="route queries to likely books")
+    routing.add_argument("--no-route", action="store_true", help="search every book")
+    parser.add_argument("--out", help="also write the result JSON here")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="fail on regression vs the baseline")
+    parser.add_argument("--recall-tol", type=float, default=0.0)
+    parser.add_argument("--latency-tol", type=float, default=0.25)
+    parser.add_argument("--rss-tol", type=float, default=0.15)
+    args = parser.parse_args()
+    # Latency / QPS / RSS baselines are machine-specific, so none is
+    # committed; fail before the (slow) run rather than after it.
+    if args.check and not args.save_baseline and not os.path.exists(args.baseline):
+        parser.error(f"no baseline at {args.baseline}; run with --save-baseline first")
+
+    result = bench(
+        load_golden(args.golden),
+        k_per_book=args.k_per_book,
+        top_n=args.top_n,
+        repeat=args.repeat,
+        workers=[int(w) for w in args.workers.split(",") if w],
+        route=args.route or (ROUTING_ENABLED and not args.no_route),
+        batch_sizes=[int(b) for b in args.batch_sizes.split(",") if b],
+    )
+    print_report(result)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Baseline → {args.baseline}")
+
+    if args.check:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failed = compare(baseline, result, args.recall_tol, args.latency_tol, args.rss_tol)
+        for f in failed:
+            print(f"FAIL: {f}")
+        if not failed:
+            print("OK: no regression vs baseline")
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
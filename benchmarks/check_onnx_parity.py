@@ -0,0 +1,93 @@
+"""
+Check that the int8 ONNX backend stays close to PyTorch fp32, and
+report the throughput of both.
+
+- embeddings: cosine similarity between torch and onnx vectors
+- reranking:  overlap of the top-n chunks each backend picks
+
+Exits non-zero when a bound is exceeded, so it can gate a backend switch.
+
+    python -m benchmarks.check_onnx_parity
+    python -m benchmarks.check_onnx_parity --min-cosine 0.99 --min-overlap 0.8
+"""
+import argparse
+import sys
+import time
+import numpy as np
+
+from benchmarks.bench_chunker import pages_from_vector_store
+from ingestion.model_backend import load_model
+
+EMBED_MODEL = "all-MiniLM-L6-v2"
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+QUESTIONS = [
+    "How many Horcruxes were created?",
+    "Who was the heir of Slytherin?",
+    "What is the Patronus charm?",
+    "Who is the Half-Blood Prince?",
+    "What does the Mirror of Erised show?",
+    "How did Harry get his scar?",
+]
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--candidates", type=int, default=84)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--min-overlap", type=float, default=0.8)
+    args = parser.parse_args()
+
+    texts = [p["text"] for p in pages_from_vector_store(args.texts)]
+    if not texts:
+        raise SystemExit("No chunk texts in vector_store/")
+
+    # Embeddings
+    vecs = {}
+    for backend in ("torch", "onnx"):
+        model = load_model(EMBED_MODEL, "embedding", backend=backend)
+        model.encode(texts[:8])  # warm-up
+        vecs[backend], secs = timed(model.encode, texts, normalize_embeddings=True)
+        print(f"embed  {backend:<6} {len(texts) / secs:8.1f} texts/s")
+
+    cos = np.sum(vecs["torch"] * vecs["onnx"], axis=1)
+    print(f"embed  cosine min={cos.min():.4f} mean={cos.mean():.4f}")
+
+    # Reranking: each question against a fixed candidate set
+    candidates = texts[:args.candidates]
+    picks = {}
+    for backend in ("torch", "onnx"):
+        model = load_model(RERANK_MODEL, "cross-encoder", backend=backend)
+        picks[backend], total = [], 0.0
+        for q in QUESTIONS:
+            scores, secs = timed(model.predict, [(q, t) for t in candidates])
+            total += secs
+            picks[backend].append(set(np.argsort(-np.asarray(scores))[:args.top_n].tolist()))
+        print(f"rerank {backend:<6} {len(QUESTIONS) * len(candidates) / total:8.1f} pairs/s")
+
+    overlap = np.mean([
+        len(a & b) / args.top_n for a, b in zip(picks["torch"], picks["onnx"])
+    ])
+    print(f"rerank top-{args.top_n} overlap={overlap:.3f}")
+
+    failed = []
+    if cos.min() < args.min_cosine:
+        failed.append(f"embedding cosine {cos.min():.4f} < {args.min_cosine}")
+    if overlap < args.min_overlap:
+        failed.append(f"rerank overlap {overlap:.3f} < {args.min_overlap}")
+
+    for f in failed:
+        print(f"FAIL: {f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
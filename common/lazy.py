@@ -0,0 +1,93 @@
+"""
+Lazily-built, process-shared model handles.
+
+Importing a module that owns a model only creates a LazyModel; the
+model is built the first time .get() is called (or by warm_up() in a
+background thread), so importers like the Streamlit app render
+immediately instead of waiting for every model at import.
+"""
+import threading
+import time
+
+_PROCESS_START = time.time()
+_handles = []
+_warmup_threads = {}
+_warmup_lock = threading.Lock()
+
+
+class LazyModel:
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+        self.load_s = None
+        self.ready_at = None
+        _handles.append(self)
+
+    @property
+    def loaded(self):
+        return self._value is not None
+
+    def get(self):
+        """
+        The model, building it on first use. Concurrent callers (e.g. a
+        query arriving while warm_up() is still loading) wait for the
+        one in-flight load instead of starting their own.
+        """
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    t0 = time.perf_counter()
+                    value = self._factory()
+                    # Timings first: loaded (_value) is what readers check.
+                    self.load_s = time.perf_counter() - t0
+                    self.ready_at = time.time()
+                    self._value = value
+        return self._value
+
+
+def warm_up(handles=None, background=True):
+    """
+    Load the given LazyModels (default: every registered one), once per
+    process. With background=True this returns immediately and loading
+    happens in a daemon thread (returned); with background=False it
+    blocks until they are loaded, waiting on a background warm-up of
+    the same handles already in progress.
+    """
+    handles = list(_handles if handles is None else handles)
+
+    def run():
+        for handle in handles:
+            handle.get()
+
+    key = tuple(id(h) for h in handles)
+    with _warmup_lock:
+        thread = _warmup_threads.get(key)
+        if thread is None and background:
+            thread = _warmup_threads[key] = threading.Thread(
+                target=run, name="model-warmup", daemon=True
+            )
+            thread.start()
+    if not background:
+        if thread is not None:
+            thread.join()
+        run()  # no-op once loaded; LazyModel.get() locks per model
+    return thread
+
+
+def startup_report(handles=None):
+    """
+    Per-model load status and timing for handles (default: every
+    registered one): seconds the load took, and seconds after process
+    start the model became ready.
+    """
+    return [
+        {
+            "model": h.name,
+            "loaded": h.loaded,
+            "load_s": round(h.load_s, 3) if h.load_s is not None else None,
+            "ready_after_s": round(h.ready_at - _PROCESS_START, 3) if h.ready_at else None,
+        }
+        for h in (_handles if handles is None else handles)
+    ]
@@ -0,0 +1,197 @@
+"""
+Per-stage latency tracing for the query path.
+
+    with trace("query", question=q):      # one per request
+        with span("rerank"):              # or @timed("rerank")
+            ...
+
+Every span feeds a process-wide rolling window per stage (percentiles
+via latency_stats() / prometheus_text()). Spans opened inside a trace
+are also attached to it, and the trace is logged as one JSON line on
+the "rag.trace" logger when it ends. The current trace is held in a
+contextvar, so it follows asyncio tasks and work submitted with
+contextvars.copy_context() to a thread pool.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+log = logging.getLogger("rag.trace")
+
+# Samples kept per stage for the rolling percentiles.
+WINDOW = int(os.getenv("TRACE_WINDOW", "1000"))
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+_current = contextvars.ContextVar("rag_trace", default=None)
+_stages = {}
+_stages_lock = threading.Lock()
+
+
+class StageStats:
+    """
+    Lifetime count / sum plus the last WINDOW samples of one stage.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            self.samples.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            samples = np.fromiter(self.samples, dtype=np.float64)
+            count, total = self.count, self.sum
+        out = {"count": count, "sum_s": total, "mean_s": total / count if count else 0.0}
+        if len(samples):
+            for q, v in zip(QUANTILES, np.quantile(samples, QUANTILES)):
+                out[f"p{round(q * 100)}_s"] = float(v)
+        return out
+
+
+class Trace:
+    def __init__(self, name, **fields):
+        self.name = name
+        self.id = uuid.uuid4().hex[:12]
+        self.fields = fields
+        self.spans = []
+        self.start = time.perf_counter()
+        self.total_s = None
+
+    def add(self, name, seconds):
+        # list.append is atomic, so spans from worker threads are safe
+        start = time.perf_counter() - seconds - self.start
+        self.spans.append((name, start, seconds))
+
+    def to_dict(self):
+        stages = {}
+        for name, _, seconds in self.spans:
+            stages[name] = stages.get(name, 0.0) + seconds
+        return {
+            "trace": self.name,
+            "id": self.id,
+            **self.fields,
+            "total_ms": round(self.total_s * 1000, 2) if self.total_s is not None else None,
+            "stages_ms": {k: round(v * 1000, 2) for k, v in stages.items()},
+            "spans": [
+                {"name": n, "start_ms": round(s * 1000, 2), "ms": round(d * 1000, 2)}
+                for n, s, d in sorted(self.spans, key=lambda x: x[1])
+            ],
+        }
+
+
+def _stage(name):
+    stats = _stages.get(name)
+    if stats is None:
+        with _stages_lock:
+            stats = _stages.setdefault(name, StageStats())
+    return stats
+
+
+def record(name, seconds):
+    """
+    Record a duration measured elsewhere (e.g. time-to-first-token).
+    """
+    _stage(name).add(seconds)
+    current = _current.get()
+    if current is not None:
+        current.add(name, seconds)
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+
+def timed(name=None):
+    """
+    Decorator form of span(); the stage defaults to the function name.
+    """
+
+    def decorate(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def trace(name, **fields):
+    """
+    Trace one request. Yields the Trace, whose .fields can be extended
+    (e.g. with cached=True) before it is logged on exit.
+    """
+    t = Trace(name, **fields)
+    token = _current.set(t)
+    try:
+        yield t
+    except Exception as e:
+        t.fields["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        t.total_s = time.perf_counter() - t.start
+        _stage(name).add(t.total_s)
+        if log.isEnabledFor(logging.INFO):
+            log.info(json.dumps(t.to_dict(), ensure_ascii=False, default=str))
+
+
+def latency_stats():
+    """
+    {stage: {count, sum_s, mean_s, p50_s, p90_s, p95_s, p99_s}}.
+    """
+    with _stages_lock:
+        items = sorted(_stages.items())
+    return {name: stats.snapshot() for name, stats in items}
+
+
+def prometheus_text():
+    """
+    Stage latencies in the Prometheus text exposition format (summary).
+    """
+    lines = [
+        "# HELP rag_stage_latency_seconds Query-path stage latency (rolling window quantiles).",
+        "# TYPE rag_stage_latency_seconds summary",
+    ]
+    for name, s in latency_stats().items():
+        for q in QUANTILES:
+            key = f"p{round(q * 100)}_s"
+            if key in s:
+                lines.append(f'rag_stage_latency_seconds{{stage="{name}",quantile="{q}"}} {s[key]:.6f}')
+        lines.append(f'rag_stage_latency_seconds_sum{{stage="{name}"}} {s["sum_s"]:.6f}')
+        lines.append(f'rag_stage_latency_seconds_count{{stage="{name}"}} {s["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _stages_lock:
+        _stages.clear()
@@ -0,0 +1,156 @@
+"""
+BM25 inverted index over chunk texts, built at ingestion time and
+stored next to each FAISS index as bm25.npz.
+
+Postings are CSR arrays (term -> chunk rows + term frequencies), so a
+query only touches the postings of its own terms.
+
+Add bm25.npz to folders built before it existed with:
+    python -m ingestion.bm25 vector_store
+"""
+import os
+import re
+import sys
+import numpy as np
+
+BM25_FILE = "bm25.npz"
+
+K1 = 1.2
+B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+POSSESSIVE_RE = re.compile(r"'s\b")
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been before being but by
+can could did do does doing done for from had has have having he her here
+hers him his how i if in into is it its just me more most my no not of on
+once only or other our out over own said same she should so some such than
+that the their them then there these they this those through to too under
+until up very was we were what when where which while who whom why will
+with would you your
+""".split())
+
+
+def _stem(token):
+    if len(token) > 4 and token.endswith(("xes", "ches", "shes", "sses")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    text = POSSESSIVE_RE.sub("", text.lower().replace("’", "'"))
+    return [_stem(t) for t in TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+def build_bm25(texts):
+    """
+    CSR postings for texts (row i = chunk i), as a dict of arrays.
+    texts may be any iterable, e.g. a generator over a chunk store.
+    """
+    vocab = {}
+    rows, terms, tfs = [], [], []
+    doc_len = []
+
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        doc_len.append(len(tokens))
+        counts = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for t, tf in counts.items():
+            rows.append(row)
+            terms.append(vocab.setdefault(t, len(vocab)))
+            tfs.append(tf)
+
+    terms = np.asarray(terms, dtype=np.int64)
+    order = np.argsort(terms, kind="stable")
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=len(vocab)), out=indptr[1:])
+
+    return {
+        "vocab": np.asarray(list(vocab), dtype=str),
+        "indptr": indptr,
+        "rows": np.asarray(rows, dtype=np.int32)[order],
+        "tf": np.asarray(tfs, dtype=np.float32)[order],
+        "doc_len": np.asarray(doc_len, dtype=np.int32),
+    }
+
+
+def write_bm25(path, texts):
+    # Write aside and rename, so a crash never leaves a truncated file.
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **build_bm25(texts))
+    os.replace(path + ".tmp", path)
+
+
+class BM25Index:
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.indptr = data["indptr"]
+            self.rows = data["rows"]
+            self.tf = data["tf"]
+            self.doc_len = data["doc_len"].astype(np.float32)
+            vocab = data["vocab"].tolist()
+
+        self.terms = {t: i for i, t in enumerate(vocab)}
+        self.n_docs = len(self.doc_len)
+        avgdl = float(self.doc_len.mean()) if self.n_docs else 1.0
+        self._norm = K1 * (1 - B + B * self.doc_len / max(avgdl, 1e-9))
+
+        df = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5))
+
+    def scores(self, query):
+        """
+        BM25 score of every chunk for the query (0 where no term matches).
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for t in set(tokenize(query)):
+            i = self.terms.get(t)
+            if i is None:
+                continue
+            lo, hi = self.indptr[i], self.indptr[i + 1]
+            rows, tf = self.rows[lo:hi], self.tf[lo:hi]
+            scores[rows] += self.idf[i] * tf * (K1 + 1) / (tf + self._norm[rows])
+        return scores
+
+    def search(self, query, k, lo=0, hi=None):
+        """
+        Up to k best-matching rows in [lo, hi), best first.
+        Rows with no matching term are never returned.
+        """
+        return top_rows(self.scores(query)[lo:hi], k) + lo
+
+
+def top_rows(scores, k):
+    k = min(k, int(np.count_nonzero(scores)))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def _folder_texts(book_path):
+    from ingestion.chunk_store import STORE_DIR, ChunkStore, store_exists
+
+    store_path = os.path.join(book_path, STORE_DIR)
+    if store_exists(store_path):
+        store = ChunkStore(store_path)
+        return [store.text(i) for i in range(len(store))]
+    if os.path.exists(os.path.join(book_path, "meta.pkl")):
+        import pickle
+        with open(os.path.join(book_path, "meta.pkl"), "rb") as f:
+            return [c["text"] for c in pickle.load(f)]
+    return None
+
+
+if __name__ == "__main__":
+    base = sys.argv[1] if len(sys.argv) > 1 else "vector_store"
+    for name in sorted(os.listdir(base)):
+        texts = _folder_texts(os.path.join(base, name))
+        if texts is not None:
+            write_bm25(os.path.join(base, name, BM25_FILE), texts)
+            print(f"BM25 → {name} ({len(texts)} chunks)")
@@ -1,9 +1,27 @@
-import os, pickle, faiss
+import os
+import argparse
+import hashlib
+import json
+import shutil
+import numpy as np
 from collections import defaultdict
-from pdf_loader import load_pdf
-from structure_parser import assign_structure
-from chunker import chunk_text
-from embeddings import embed
+from itertools import islice
+from ingestion.pdf_loader import iter_pages, load_pdf_parallel
+from ingestion.structure_parser import assign_structure, iter_structure
+from ingestion.chunker import SPLITTERS, chunk_text, iter_chunks
+from ingestion.embeddings import MODEL_KEY, embed
+from ingestion.index_factory import (
+    INDEX_TYPES, IndexBuilder, index_path, make_index, normalize, write_index,
+)
+from ingestion.chunk_store import (
+    STORE_DIR, ChunkStore, ChunkStoreWriter, replace_dir, write_chunk_store,
+)
+from ingestion.bm25 import BM25_FILE, write_bm25
+from ingestion.centroids import CENTROIDS_FILE, CentroidAccumulator, write_centroids
+from ingestion.checkpoint import CHECKPOINT_DIR, BuildCheckpoint
+from ingestion.manifest import (
+    file_digest, hash_pages, hash_text, read_manifest, update_pages_hash, write_manifest,
+)
 import re
 
 def safe_folder_name(text: str) -> str:
@@ -14,30 +32,376 @@ def safe_folder_name(text: str) -> str:
 
 PDF_PATH = "data/harrypotter.pdf"
 OUT_DIR = "vector_store"
+CORPUS_DIR = "_corpus"
 
-pages = load_pdf(PDF_PATH)
-structured = assign_structure(pages)
-chunks = chunk_text(structured)
 
-books = defaultdict(list)
-for c in chunks:
-    books[c["book"]].append(c)
+def _write_info(path, info):
+    tmp = f"{path}/info.json.tmp"
+    with open(tmp, "w") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp, f"{path}/info.json")
 
-os.makedirs(OUT_DIR, exist_ok=True)
 
-for book, items in books.items():
-    texts = [i["text"] for i in items]
-    vectors = embed(texts)
-
-    index = faiss.IndexFlatL2(vectors.shape[1])
-    index.add(vectors)
+def write_book_index(out_dir, book, items, vectors, index_type="fp16", nlist=None):
+    vectors = normalize(vectors)
+    index, info = make_index(index_type, vectors, nlist)
 
     safe = safe_folder_name(book)
-    path = f"{OUT_DIR}/{safe}"
+    path = f"{out_dir}/{safe}"
+    os.makedirs(path, exist_ok=True)
+
+    write_index(index, path)
+    write_chunk_store(f"{path}/{STORE_DIR}", items)
+    write_bm25(f"{path}/{BM25_FILE}", [i["text"] for i in items])
+    write_centroids(f"{path}/{CENTROIDS_FILE}", items, vectors)
+    _write_info(path, dict(info, book=book))
+
+    print(f"Indexed → {book}")
+
+
+def write_corpus_index(out_dir, indexed, index_type="fp16", nlist=None):
+    """
+    One index over every book. Rows are laid out book by book, so each
+    book owns a contiguous id range; the chunk store interns book and
+    chapter names into small tables referenced by per-row int ids.
+    """
+    chunks = [item for _, items, _ in indexed for item in items]
+    vectors = normalize(np.vstack([v for _, _, v in indexed]))
+    index, info = make_index(index_type, vectors, nlist)
+
+    path = f"{out_dir}/{CORPUS_DIR}"
     os.makedirs(path, exist_ok=True)
 
-    faiss.write_index(index, f"{path}/index.faiss")
-    with open(f"{path}/meta.pkl", "wb") as f:
-        pickle.dump(items, f)
+    write_index(index, path)
+    write_chunk_store(f"{path}/{STORE_DIR}", chunks)
+    write_bm25(f"{path}/{BM25_FILE}", [c["text"] for c in chunks])
+    write_centroids(f"{path}/{CENTROIDS_FILE}", chunks, vectors)
+    _write_info(path, dict(info, books=[book for book, _, _ in indexed]))
+
+    print(f"Indexed → unified corpus ({len(indexed)} books, {len(chunks)} chunks)")
+
+
+def parse_books(ckpt, pdf_path, source, workers=None):
+    """
+    Page stage: parse the PDF (page ranges in parallel), assign
+    book/chapter and checkpoint each book's pages.
+    """
+    pages = load_pdf_parallel(pdf_path, workers)
+    structured = assign_structure(pages)
+
+    by_book = defaultdict(list)
+    for p in structured:
+        if p["book"]:
+            by_book[p["book"]].append(p)
+
+    books = {book: safe_folder_name(book) for book in by_book}
+    for book, folder in books.items():
+        ckpt.save_json(folder, "pages.json", by_book[book])
+    ckpt.save_books(source, books)
+
+    print(f"Parsed → {len(pages)} pages, {len(books)} books")
+    return books
+
+
+def embed_incremental(ckpt, folder, texts, batch_size):
+    """
+    Embed chunk texts, reusing vectors of texts that were already
+    embedded (same text hash, same model and backend) by the previous build.
+    """
+    hashes = [hash_text(t) for t in texts]
+    known = ckpt.load_embeddings(folder, MODEL_KEY)
+
+    missing = {}
+    for h, t in zip(hashes, texts):
+        if h not in known:
+            missing.setdefault(h, t)
+
+    if missing:
+        fresh = embed(list(missing.values()), batch_size=batch_size)
+        known.update(zip(missing.keys(), fresh))
+
+    vectors = np.stack([known[h] for h in hashes]).astype("float32")
+    ckpt.save_embeddings(folder, MODEL_KEY, hashes, vectors)
+    print(f"  embedded {len(missing)} new chunks, reused {len(texts) - len(missing)}")
+    return vectors
+
+
+def book_manifest(book, pages_hash, chunker, index_type, nlist):
+    return {
+        "book": book,
+        "pages_hash": pages_hash,
+        "chunker": chunker,
+        "embedding_model": MODEL_KEY,
+        "index": {"index_type": index_type, "nlist": nlist, "normalized": True},
+    }
+
+
+def build(pdf_path=PDF_PATH, out_dir=OUT_DIR, layout="per-book",
+          index_type="fp16", nlist=None, workers=None, spacy_processes=1,
+          spacy_batch_size=32, embed_batch_size=256, max_chars=550,
+          overlap_sents=3, splitter="spacy", fresh=False):
+    """
+    Incremental, resumable build.
+
+    Stage outputs are checkpointed per book under <out_dir>/.build and
+    every index folder gets a manifest.json of content hashes, so a
+    rerun only redoes work whose inputs changed:
+    - same PDF digest            -> pages are not re-parsed
+    - same pages + chunker config -> chunks are not recomputed
+    - same chunk text + model     -> its embedding is reused
+    - same manifest               -> the book's index is left alone
+    fresh=True ignores all of it and starts over.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    ckpt = BuildCheckpoint(f"{out_dir}/{CHECKPOINT_DIR}")
+    if fresh:
+        ckpt.clear()
+
+    source = file_digest(pdf_path)
+    books = ckpt.books(source) or parse_books(ckpt, pdf_path, source, workers)
+    chunker = {"max_chars": max_chars, "overlap_sents": overlap_sents, "splitter": splitter}
+
+    indexed = []
+    for book, folder in books.items():
+        pages = ckpt.load_json(folder, "pages.json")
+        manifest = book_manifest(book, hash_pages(pages), chunker, index_type, nlist)
+        chunks_key = {k: manifest[k] for k in ("pages_hash", "chunker")}
+
+        book_path = f"{out_dir}/{folder}"
+        up_to_date = (
+            read_manifest(book_path) == manifest
+            and index_path(book_path) is not None
+        )
+        if up_to_date and layout == "per-book":
+            print(f"Up to date → {book}")
+            continue
+
+        cached = ckpt.load_json(folder, "chunks.json") if ckpt.has(folder, "chunks.json") else None
+        if cached and cached["key"] == chunks_key:
+            items = cached["chunks"]
+        else:
+            items = chunk_text(
+                pages,
+                max_chars=max_chars,
+                overlap_sents=overlap_sents,
+                n_process=spacy_processes,
+                batch_size=spacy_batch_size,
+                splitter=splitter,
+            )
+            ckpt.save_json(folder, "chunks.json", {"key": chunks_key, "chunks": items})
+
+        vectors = embed_incremental(ckpt, folder, [i["text"] for i in items], embed_batch_size)
+
+        if layout in ("per-book", "both"):
+            if up_to_date:
+                print(f"Up to date → {book}")
+            else:
+                write_book_index(out_dir, book, items, vectors, index_type, nlist)
+                write_manifest(book_path, manifest)
+        if layout in ("unified", "both"):
+            indexed.append((book, items, vectors))
+
+    if indexed:
+        write_corpus_index(out_dir, indexed, index_type, nlist)
+
+
+class IndexFolderWriter:
+    """
+    One output folder (a book, or the unified corpus) filled batch by
+    batch: vectors go to the index, text to the chunk store, and
+    centroids keep running sums. BM25 is built on close() by reading
+    the finished chunk store back.
+
+    Everything is written to a hidden sibling directory that close()
+    swaps in for path, so an interrupted build leaves the previous
+    folder (and its manifest) untouched.
+    """
+
+    def __init__(self, path, index_type="fp16", nlist=None):
+        head, name = os.path.split(path)
+        self.path = path
+        self.tmp = os.path.join(head, f".{name}.tmp")
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.index = IndexBuilder(self.tmp, index_type, nlist)
+        self.store = ChunkStoreWriter(f"{self.tmp}/{STORE_DIR}")
+        self.centroids = CentroidAccumulator()
+
+    def add(self, items, vectors):
+        self.index.add(vectors)
+        for c in items:
+            self.store.add(c)
+        self.centroids.add(items, vectors)
+
+    def close(self, manifest=None, **info):
+        index_info = self.index.finish()
+        self.store.close()
+        store = ChunkStore(f"{self.tmp}/{STORE_DIR}")
+        write_bm25(f"{self.tmp}/{BM25_FILE}", (store.text(i) for i in range(len(store))))
+        self.centroids.write(f"{self.tmp}/{CENTROIDS_FILE}")
+        _write_info(self.tmp, dict(index_info, **info))
+        if manifest is not None:
+            write_manifest(self.tmp, manifest)
+        replace_dir(self.tmp, self.path)
+        return len(store)
+
+
+def _batches(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _book_runs(batch):
+    """
+    (book, start, end) for each run of consecutive same-book chunks.
+    """
+    start = 0
+    for i in range(1, len(batch) + 1):
+        if i == len(batch) or batch[i]["book"] != batch[start]["book"]:
+            yield batch[start]["book"], start, i
+            start = i
+
+
+def build_streaming(pdf_path=PDF_PATH, out_dir=OUT_DIR, layout="per-book",
+                    index_type="fp16", nlist=None, spacy_processes=1,
+                    spacy_batch_size=32, embed_batch_size=256, max_chars=550,
+                    overlap_sents=3, splitter="spacy"):
+    """
+    Single-pass build whose memory is bounded by the batch sizes, not
+    the corpus: pages stream from fitz through structure assignment and
+    chunking, and every embed_batch_size chunks are embedded, normalized
+    and appended to the open index folders.
+
+    What stays in memory is per-chunk bookkeeping (a few integers), one
+    centroid sum per chapter, the FAISS index being filled (vectors.npy
+    for index_type="numpy" is written as it goes) and, while a folder is
+    closed, its BM25 postings. No checkpoints are read or written and no
+    embeddings are reused; per-book folders still get a manifest.json,
+    so a later incremental build sees them as up to date.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    chunker = {"max_chars": max_chars, "overlap_sents": overlap_sents, "splitter": splitter}
+    page_hashes = defaultdict(hashlib.sha256)
+
+    def hashed(pages):
+        for p in pages:
+            if p["book"]:
+                update_pages_hash(page_hashes[p["book"]], p)
+            yield p
+
+    chunks = iter_chunks(
+        hashed(iter_structure(iter_pages(pdf_path))),
+        max_chars=max_chars,
+        overlap_sents=overlap_sents,
+        n_process=spacy_processes,
+        batch_size=spacy_batch_size,
+        splitter=splitter,
+    )
+
+    corpus = None
+    if layout in ("unified", "both"):
+        corpus = IndexFolderWriter(f"{out_dir}/{CORPUS_DIR}", index_type, nlist)
+    book, writer = None, None
+
+    def close_book():
+        # Every page of a book has been read once a later book's chunk
+        # (or the end of the stream) shows up, so its hash is final.
+        manifest = book_manifest(
+            book, page_hashes.pop(book).hexdigest(), chunker, index_type, nlist
+        )
+        n = writer.close(manifest, book=book)
+        print(f"Indexed → {book} ({n} chunks)")
+
+    for batch in _batches(chunks, embed_batch_size):
+        vectors = normalize(embed(
+            [c["text"] for c in batch], batch_size=embed_batch_size, show_progress_bar=False
+        ))
+        if layout in ("per-book", "both"):
+            for run_book, lo, hi in _book_runs(batch):
+                if run_book != book:
+                    if writer is not None:
+                        close_book()
+                    book = run_book
+                    writer = IndexFolderWriter(
+                        f"{out_dir}/{safe_folder_name(book)}", index_type, nlist
+                    )
+                writer.add(batch[lo:hi], vectors[lo:hi])
+        if corpus is not None:
+            corpus.add(batch, vectors)
+
+    if writer is not None:
+        close_book()
+    if corpus is not None:
+        n = corpus.close(books=list(corpus.store.books))
+        print(f"Indexed → unified corpus ({len(corpus.store.books)} books, {n} chunks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the FAISS vector store.")
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument(
+        "--layout",
+        choices=["per-book", "unified", "both"],
+        default="per-book",
+        help="one index per book, one combined corpus index, or both",
+    )
+    parser.add_argument(
+        "--index-type",
+        choices=INDEX_TYPES,
+        default="fp16",
+        help="normalized fp16 / int8 (sq8) inner-product scan, exact fp32 flat, "
+             "approximate IVF / HNSW / IVF-PQ, or numpy (no FAISS needed)",
+    )
+    parser.add_argument(
+        "--nlist",
+        type=int,
+        default=None,
+        help="inverted lists for ivf/ivfpq (default: ~4*sqrt(n))",
+    )
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for PDF parsing (default: all cores)")
+    parser.add_argument("--spacy-processes", type=int, default=1,
+                        help="n_process for spaCy nlp.pipe")
+    parser.add_argument("--spacy-batch-size", type=int, default=32)
+    parser.add_argument("--embed-batch-size", type=int, default=256)
+    parser.add_argument("--max-chars", type=int, default=550,
+                        help="chunker: max characters per chunk")
+    parser.add_argument("--overlap-sents", type=int, default=3,
+                        help="chunker: sentences shared by consecutive chunks")
+    parser.add_argument("--splitter", choices=SPLITTERS, default="spacy",
+                        help="sentence splitter: full spaCy pipeline, "
+                             "rule-based sentencizer, or regex")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore checkpoints from a previous build")
+    parser.add_argument("--stream", action="store_true",
+                        help="single pass with memory bounded by the batch sizes "
+                             "(no checkpoints or embedding reuse)")
+    args = parser.parse_args()
+    if args.stream:
+        build_streaming(
+            args.pdf, args.out, args.layout, args.index_type, args.nlist,
+            spacy_processes=args.spacy_processes,
+            spacy_batch_size=args.spacy_batch_size,
+            embed_batch_size=args.embed_batch_size,
+            max_chars=args.max_chars,
+            overlap_sents=args.overlap_sents,
+            splitter=args.splitter,
+        )
+        return
+    build(
+        args.pdf, args.out, args.layout, args.index_type, args.nlist,
+        workers=args.workers,
+        spacy_processes=args.spacy_processes,
+        spacy_batch_size=args.spacy_batch_size,
+        embed_batch_size=args.embed_batch_size,
+        max_chars=args.max_chars,
+        overlap_sents=args.overlap_sents,
+        splitter=args.splitter,
+        fresh=args.fresh,
+    )
+
 
-    print(f"Indexed → {book}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
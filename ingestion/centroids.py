@@ -0,0 +1,164 @@
+"""
+Per-book and per-chapter centroids of the chunk embeddings, stored
+next to each vector index as centroids.npz and used at query time to
+route a question to the books worth searching (see rag.router).
+
+Chunks are laid out in reading order, so each chapter is a contiguous
+row range; a chapter's centroid is the normalized mean of its rows.
+
+Add centroids.npz to folders built before it existed with:
+    python -m ingestion.centroids vector_store
+"""
+import os
+import sys
+import numpy as np
+
+CENTROIDS_FILE = "centroids.npz"
+
+
+def _unit_rows(x):
+    x = np.asarray(x, dtype="float32")
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def build_centroids(items, vectors):
+    """
+    Centroid arrays for chunks items (dicts with book / chapter) and
+    their embeddings, as a dict of arrays.
+    """
+    acc = CentroidAccumulator(np.shape(vectors)[1])
+    acc.add(items, vectors)
+    return acc.arrays()
+
+
+def write_centroids(path, items, vectors):
+    _write_arrays(path, build_centroids(items, vectors))
+
+
+def _write_arrays(path, arrays):
+    # Write aside and rename, so a crash never leaves a truncated file.
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+class CentroidAccumulator:
+    """
+    build_centroids over chunks that arrive in batches (in reading
+    order): keeps one running sum per chapter, not the vectors.
+    A chapter's direction is that of its sum, the same as its mean's.
+    """
+
+    def __init__(self, dim=None):
+        self.dim = dim
+        self.books, self.chapters = [], []
+        self._chapter_book, self._ranges, self._sums = [], [], []
+        self._rows = 0
+
+    def add(self, items, vectors):
+        if not len(items):
+            return
+        vectors = _unit_rows(vectors)
+        self.dim = vectors.shape[1]
+
+        start = 0
+        for row in range(1, len(items) + 1):
+            if row < len(items) and (
+                items[row]["book"] == items[start]["book"]
+                and items[row]["chapter"] == items[start]["chapter"]
+            ):
+                continue
+            self._add_run(items[start], vectors[start:row])
+            start = row
+
+    def _add_run(self, item, vectors):
+        book, chapter = item["book"], item["chapter"]
+        lo, hi = self._rows, self._rows + len(vectors)
+        self._rows = hi
+
+        continues = (
+            self._ranges and self._ranges[-1][1] == lo
+            and self.books[self._chapter_book[-1]] == book and self.chapters[-1] == chapter
+        )
+        if continues:
+            self._ranges[-1][1] = hi
+            self._sums[-1] += vectors.sum(axis=0)
+            return
+
+        if not self.books or self.books[-1] != book:
+            self.books.append(book)
+        self.chapters.append(chapter)
+        self._chapter_book.append(len(self.books) - 1)
+        self._ranges.append([lo, hi])
+        self._sums.append(vectors.sum(axis=0))
+
+    def arrays(self):
+        dim = self.dim or 0
+        book_ids = np.asarray(self._chapter_book, dtype=np.int32)
+        sums = np.asarray(self._sums, dtype="float32") if self._sums else np.zeros((0, dim), dtype="float32")
+        book_sums = np.zeros((len(self.books), dim), dtype="float32")
+        np.add.at(book_sums, book_ids, sums)
+        return {
+            "books": np.asarray(self.books, dtype=str),
+            "book_centroids": _unit_rows(book_sums),
+            "chapters": np.asarray(self.chapters, dtype=str),
+            "chapter_book": book_ids,
+            "chapter_ranges": np.asarray(self._ranges, dtype=np.int64).reshape(-1, 2),
+            "chapter_centroids": _unit_rows(sums),
+        }
+
+    def write(self, path):
+        _write_arrays(path, self.arrays())
+
+
+class Centroids:
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.books = data["books"].tolist()
+            self.book_centroids = data["book_centroids"]
+            self.chapters = data["chapters"].tolist()
+            self.chapter_book = data["chapter_book"]
+            self.chapter_ranges = data["chapter_ranges"]
+            self.chapter_centroids = data["chapter_centroids"]
+
+
+def _folder_vectors(file_path):
+    from ingestion.index_factory import read_index
+
+    index = read_index(file_path)
+    if file_path.endswith(".faiss"):
+        import faiss
+        try:
+            faiss.extract_index_ivf(index).make_direct_map()
+        except RuntimeError:
+            pass  # not an IVF index
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _folder_chunks(book_path):
+    from ingestion.chunk_store import STORE_DIR, ChunkStore, store_exists
+
+    store_path = os.path.join(book_path, STORE_DIR)
+    if store_exists(store_path):
+        return list(ChunkStore(store_path))
+    if os.path.exists(os.path.join(book_path, "meta.pkl")):
+        import pickle
+        with open(os.path.join(book_path, "meta.pkl"), "rb") as f:
+            return pickle.load(f)
+    return None
+
+
+if __name__ == "__main__":
+    from ingestion.index_factory import index_path
+
+    base = sys.argv[1] if len(sys.argv) > 1 else "vector_store"
+    for name in sorted(os.listdir(base)):
+        path = os.path.join(base, name)
+        file_path = index_path(path)
+        if file_path is None:
+            continue
+        items = _folder_chunks(path)
+        if items is not None:
+            write_centroids(os.path.join(path, CENTROIDS_FILE), items, _folder_vectors(file_path))
+            print(f"Centroids → {name} ({len(items)} chunks)")
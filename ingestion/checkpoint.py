@@ -0,0 +1,91 @@
+import json
+import os
+import shutil
+import numpy as np
+
+CHECKPOINT_DIR = ".build"
+
+
+def _atomic_write(path, write):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class BuildCheckpoint:
+    """
+    Per-book stage outputs of an index build, so a crashed or partial
+    build resumes where it stopped.
+
+        <root>/books.json               source PDF digest + book -> folder
+        <root>/<folder>/pages.json      structured pages
+        <root>/<folder>/chunks.json     chunk dicts + the key they were built from
+        <root>/<folder>/embeddings.npz  chunk embeddings keyed by chunk-text hash
+
+    Every file is written to a temp name and renamed, so a stage either
+    exists complete or not at all.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, folder, name):
+        return os.path.join(self.root, folder, name)
+
+    def books(self, source):
+        """
+        {book: folder} if the page stage already ran on this source
+        PDF digest, else None.
+        """
+        path = os.path.join(self.root, "books.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data["books"] if data.get("source") == source else None
+
+    def save_books(self, source, books):
+        payload = json.dumps({"source": source, "books": books}, ensure_ascii=False)
+        _atomic_write(
+            os.path.join(self.root, "books.json"),
+            lambda f: f.write(payload.encode("utf-8")),
+        )
+
+    def has(self, folder, name):
+        return os.path.exists(self._path(folder, name))
+
+    def save_json(self, folder, name, data):
+        os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        _atomic_write(self._path(folder, name), lambda f: f.write(payload))
+
+    def load_json(self, folder, name):
+        with open(self._path(folder, name), encoding="utf-8") as f:
+            return json.load(f)
+
+    def load_embeddings(self, folder, model_name):
+        """
+        {chunk-text hash: vector} from the last build of this book,
+        empty if there is none or it used another model.
+        """
+        if not self.has(folder, "embeddings.npz"):
+            return {}
+        with np.load(self._path(folder, "embeddings.npz")) as data:
+            if str(data["model"]) != model_name:
+                return {}
+            return dict(zip(data["hashes"].tolist(), data["vectors"]))
+
+    def save_embeddings(self, folder, model_name, hashes, vectors):
+        os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+        _atomic_write(
+            self._path(folder, "embeddings.npz"),
+            lambda f: np.savez(
+                f, model=np.array(model_name), hashes=np.array(hashes), vectors=vectors
+            ),
+        )
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
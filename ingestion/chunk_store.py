@@ -0,0 +1,192 @@
+"""
+Columnar, memory-mapped chunk metadata.
+
+A store is a directory holding:
+    text.bin         every chunk's text, UTF-8, back to back
+    offsets.npy      int64[n + 1] byte offsets into text.bin
+    book_ids.npy     int16[n]  index into tables.json "books"
+    chapter_ids.npy  int32[n]  index into tables.json "chapters"
+    tables.json      interned book / chapter names
+
+Opening a store maps the files instead of reading them, so only the
+chunks actually looked up are decoded into Python objects.
+
+Convert legacy meta.pkl folders in place with:
+    python -m ingestion.chunk_store vector_store
+"""
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+import numpy as np
+
+STORE_DIR = "chunks"
+STORE_FILES = ("text.bin", "offsets.npy", "book_ids.npy", "chapter_ids.npy", "tables.json")
+
+
+def store_paths(path):
+    return [os.path.join(path, f) for f in STORE_FILES]
+
+
+def store_exists(path):
+    return all(os.path.exists(p) for p in store_paths(path))
+
+
+def write_chunk_store(path, chunks):
+    """
+    Write chunk dicts ({"book", "chapter", "text"}) as a columnar store,
+    replacing any store at path only once the new one is complete.
+    """
+    with ChunkStoreWriter(path) as writer:
+        for c in chunks:
+            writer.add(c)
+
+
+def replace_dir(tmp, path):
+    """
+    Move the finished directory tmp to path. An existing path is renamed
+    aside first and deleted afterwards, so processes that have its files
+    mapped keep reading the old inodes and path never holds a mix of
+    old and new files.
+    """
+    old = None
+    if os.path.exists(path):
+        head, name = os.path.split(path)
+        old = os.path.join(head, f".{name}.old")  # hidden from vector_store listings
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(path, old)
+    os.replace(tmp, path)
+    if old:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class ChunkStoreWriter:
+    """
+    Build a store one chunk at a time. Text goes straight to text.bin;
+    only a few integers per chunk are kept until close() writes the
+    offset / id columns and the name tables.
+
+    Everything is written to path + ".tmp" and swapped in by close(), so
+    a store that is open (mmapped) elsewhere is never truncated and a
+    half-written store never shows up at path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp = path + ".tmp"
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        os.makedirs(self.tmp)
+        self.books, self.chapters = {}, {}
+        self._text = open(os.path.join(self.tmp, "text.bin"), "wb")
+        self._offsets = array("q", [0])
+        self._book_ids = array("h")
+        self._chapter_ids = array("i")
+
+    def __len__(self):
+        return len(self._book_ids)
+
+    def add(self, chunk):
+        data = chunk["text"].encode("utf-8")
+        self._text.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        self._book_ids.append(self.books.setdefault(chunk["book"], len(self.books)))
+        self._chapter_ids.append(self.chapters.setdefault(chunk["chapter"], len(self.chapters)))
+
+    def close(self):
+        self._text.close()
+        np.save(os.path.join(self.tmp, "offsets.npy"), np.frombuffer(self._offsets, dtype=np.int64))
+        np.save(os.path.join(self.tmp, "book_ids.npy"), np.frombuffer(self._book_ids, dtype=np.int16))
+        np.save(os.path.join(self.tmp, "chapter_ids.npy"), np.frombuffer(self._chapter_ids, dtype=np.int32))
+        with open(os.path.join(self.tmp, "tables.json"), "w") as f:
+            json.dump({"books": list(self.books), "chapters": list(self.chapters)}, f, ensure_ascii=False)
+        replace_dir(self.tmp, self.path)
+
+    def abort(self):
+        self._text.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ChunkStore:
+    """
+    Read-only view over a chunk store. Behaves like a list of chunk
+    dicts: len(store), store[i] and store.take(ids).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.book_ids = np.load(os.path.join(path, "book_ids.npy"), mmap_mode="r")
+        self.chapter_ids = np.load(os.path.join(path, "chapter_ids.npy"), mmap_mode="r")
+
+        with open(os.path.join(path, "tables.json")) as f:
+            tables = json.load(f)
+        self.books = tables["books"]
+        self.chapters = tables["chapters"]
+
+        with open(os.path.join(path, "text.bin"), "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._text = b""
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def text(self, i):
+        return self._text[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return {
+            "book": self.books[self.book_ids[i]],
+            "chapter": self.chapters[self.chapter_ids[i]],
+            "text": self.text(i),
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, ids):
+        return [self[i] for i in ids]
+
+    def book_ranges(self):
+        """
+        (lo, hi) row range of each book, assuming rows were written
+        book by book (as the unified corpus index does).
+        """
+        ids = np.asarray(self.book_ids)
+        return [
+            (int(np.searchsorted(ids, b, "left")), int(np.searchsorted(ids, b, "right")))
+            for b in range(len(self.books))
+        ]
+
+
+def convert_meta_pkl(book_path):
+    import pickle
+
+    with open(os.path.join(book_path, "meta.pkl"), "rb") as f:
+        items = pickle.load(f)
+    write_chunk_store(os.path.join(book_path, STORE_DIR), items)
+    return len(items)
+
+
+if __name__ == "__main__":
+    base = sys.argv[1] if len(sys.argv) > 1 else "vector_store"
+    for name in sorted(os.listdir(base)):
+        book_path = os.path.join(base, name)
+        if os.path.exists(os.path.join(book_path, "meta.pkl")):
+            n = convert_meta_pkl(book_path)
+            print(f"Converted → {name} ({n} chunks)")
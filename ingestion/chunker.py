@@ -1,10 +1,37 @@
-import spacy
 import re
+from common.lazy import LazyModel
 
-nlp = spacy.load("en_core_web_sm")
+
+def _load_spacy():
+    import spacy
+    return spacy.load("en_core_web_sm")
+
+
+def _load_sentencizer():
+    import spacy
+    pipeline = spacy.blank("en")
+    pipeline.add_pipe("sentencizer")
+    return pipeline
+
+
+nlp = LazyModel("en_core_web_sm", _load_spacy)
+sentencizer = LazyModel("sentencizer", _load_sentencizer)
 
 CHAPTER_HEADING_RE = re.compile(r"^chapter\s+\w+", re.IGNORECASE)
 
+# Sentence splitters, slowest / most accurate first:
+# - spacy:       full en_core_web_sm pipeline, sentences from the parser
+# - sentencizer: blank English tokenizer + rule-based sentencizer
+# - regex:       no spaCy at all
+SPLITTERS = ("spacy", "sentencizer", "regex")
+
+# End of sentence: . ! or ? (optionally closed by a quote/bracket),
+# then whitespace, then something that can start a sentence.
+SENT_END_RE = re.compile(
+    r"(?:(?<=[.!?])|(?<=[.!?][\"'”’)\]]))\s+(?=[\"'“‘(\[]?[A-Z0-9])"
+)
+ABBREVIATIONS = ("Mr.", "Mrs.", "Ms.", "Dr.", "Prof.", "St.", "Mt.")
+
 def clean_text(text: str) -> str:
     """
     Remove chapter headings and excessive whitespace.
@@ -23,38 +50,98 @@ def clean_text(text: str) -> str:
     return " ".join(lines)
 
 
-def chunk_text(structured_pages, max_chars=550, overlap_sents=3):
+def regex_sentences(text):
+    """
+    Split on sentence-final punctuation, re-joining splits that came
+    from a title abbreviation ("Mr. Dursley").
+    """
+    sents = []
+    for part in SENT_END_RE.split(text):
+        if sents and sents[-1].endswith(ABBREVIATIONS):
+            sents[-1] += " " + part
+        else:
+            sents.append(part)
+    return sents
+
+
+def split_pages(texts, splitter="spacy", n_process=1, batch_size=32):
+    """
+    Yield the list of sentence strings of each text, in order.
+    """
+    for sents, _ in _split_with_context(((t, None) for t in texts), splitter, n_process, batch_size):
+        yield sents
+
+
+def _split_with_context(pairs, splitter="spacy", n_process=1, batch_size=32):
+    """
+    split_pages over (text, context) pairs, yielding (sentences, context)
+    so callers need not keep their own copy of the input stream.
+    """
+    if splitter == "regex":
+        for text, context in pairs:
+            yield regex_sentences(text), context
+        return
+
+    if splitter == "spacy":
+        pipeline = nlp.get()
+    elif splitter == "sentencizer":
+        pipeline = sentencizer.get()
+    else:
+        raise ValueError(f"Unknown splitter: {splitter}")
+
+    for doc, context in pipeline.pipe(
+        pairs, as_tuples=True, n_process=n_process, batch_size=batch_size
+    ):
+        yield [sent.text for sent in doc.sents], context
+
+
+def chunk_text(structured_pages, max_chars=550, overlap_sents=3,
+               n_process=1, batch_size=32, splitter="spacy"):
     """
     Dense, sentence-aware chunking optimized for fact retrieval.
+
+    Pages are fed through nlp.pipe, so n_process > 1 parses them in
+    spaCy worker processes while chunks are still assembled in order.
+    splitter picks how sentences are found (see SPLITTERS).
     """
+    return list(iter_chunks(
+        structured_pages, max_chars, overlap_sents, n_process, batch_size, splitter
+    ))
+
 
-    chunks = []
+def iter_chunks(structured_pages, max_chars=550, overlap_sents=3,
+                n_process=1, batch_size=32, splitter="spacy"):
+    """
+    Lazy chunk_text: yields chunks as soon as they are complete, pulling
+    pages from structured_pages (which may be a generator) only as
+    needed, so at most a spaCy batch of pages is in memory.
+    """
     buffer = []
     buffer_len = 0
     meta = None
 
-    for p in structured_pages:
-        if not p["book"] or not p["chapter"]:
-            continue
-
-        current_meta = (p["book"], p["chapter"])
+    pages = (
+        (clean_text(p["text"]), (p["book"], p["chapter"]))
+        for p in structured_pages
+        if p["book"] and p["chapter"]
+    )
 
+    for sents, current_meta in _split_with_context(pages, splitter, n_process, batch_size):
         if meta and current_meta != meta:
-            _flush(chunks, buffer, meta)
+            if buffer:
+                yield _chunk(buffer, meta)
             buffer, buffer_len = [], 0
 
         meta = current_meta
 
-        text = clean_text(p["text"])
-        doc = nlp(text)
-
-        for sent in doc.sents:
-            s = sent.text.strip()
+        for sent in sents:
+            s = sent.strip()
             if not s:
                 continue
 
             if buffer_len + len(s) > max_chars:
-                _flush(chunks, buffer, meta)
+                if buffer:
+                    yield _chunk(buffer, meta)
                 buffer = buffer[-overlap_sents:]
                 buffer_len = sum(len(x) for x in buffer)
 
@@ -62,16 +149,12 @@ def chunk_text(structured_pages, max_chars=550, overlap_sents=3):
             buffer_len += len(s)
 
     if buffer:
-        _flush(chunks, buffer, meta)
-
-    return chunks
+        yield _chunk(buffer, meta)
 
 
-def _flush(chunks, buffer, meta):
-    if not buffer:
-        return
-    chunks.append({
+def _chunk(buffer, meta):
+    return {
         "book": meta[0],
         "chapter": meta[1],
         "text": " ".join(buffer)
-    })
\ No newline at end of file
+    }
@@ -1,6 +1,147 @@
-from sentence_transformers import SentenceTransformer
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from common.lazy import LazyModel
+from common.tracing import timed
+from ingestion.model_backend import BACKEND, load_model
 
-_model = SentenceTransformer("all-MiniLM-L6-v2")
+MODEL_NAME = "all-MiniLM-L6-v2"
+# Model plus runtime: torch and the int8 ONNX export embed into slightly
+# different spaces, so anything storing vectors keys on this.
+MODEL_KEY = f"{MODEL_NAME}@{BACKEND}"
 
-def embed(texts):
-    return _model.encode(texts, show_progress_bar=True)
\ No newline at end of file
+embedder = LazyModel(MODEL_NAME, lambda: load_model(MODEL_NAME, "embedding"))
+
+@timed("embed")
+def embed(texts, batch_size=32, show_progress_bar=True):
+    return embedder.get().encode(texts, batch_size=batch_size, show_progress_bar=show_progress_bar)
+
+
+def normalize_query(text):
+    """
+    Cache key form of a question: case- and whitespace-insensitive.
+    """
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query embeddings keyed on (model, normalized text),
+    with an optional on-disk layer (one .npy per query) that survives
+    restarts and is shared by every process pointing at the same dir.
+    """
+
+    def __init__(self, maxsize=1024, cache_dir=None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(text, model_name=MODEL_KEY):
+        raw = f"{model_name}\0{normalize_query(text)}".encode("utf-8")
+        return hashlib.sha1(raw).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        with self._lock:
+            vec = self._items.get(key)
+            if vec is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return vec
+
+        if self.cache_dir and os.path.exists(self._disk_path(key)):
+            try:
+                vec = np.load(self._disk_path(key))
+            except (OSError, ValueError):
+                vec = None
+            if vec is not None:
+                self._remember(key, vec)
+                with self._lock:
+                    self.disk_hits += 1
+                return vec
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, vec):
+        self._remember(key, vec)
+        if self.cache_dir:
+            tmp = self._disk_path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, vec)
+            os.replace(tmp, self._disk_path(key))
+
+    def _remember(self, key, vec):
+        vec.setflags(write=False)  # shared between callers
+        with self._lock:
+            self._items[key] = vec
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+            }
+
+
+query_cache = QueryEmbeddingCache(
+    maxsize=int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024")),
+    cache_dir=os.getenv("QUERY_EMBED_CACHE_DIR") or None,
+)
+
+
+@timed("embed_query")
+def embed_query(text):
+    """
+    Embedding for a single question, served from the query cache when
+    the same (normalized) question was embedded before.
+    """
+    key = QueryEmbeddingCache.key(text)
+    vec = query_cache.get(key)
+    if vec is None:
+        vec = embedder.get().encode([text], show_progress_bar=False)[0]
+        query_cache.put(key, vec)
+    return vec
+
+
+@timed("embed_queries")
+def embed_queries(texts, batch_size=64):
+    """
+    Embeddings for many questions as one (n, d) array: cached ones are
+    reused, the rest are encoded together in batched forward passes.
+    """
+    keys = [QueryEmbeddingCache.key(t) for t in texts]
+    vecs = [query_cache.get(k) for k in keys]
+
+    todo = {}
+    for i, vec in enumerate(vecs):
+        if vec is None:
+            todo.setdefault(keys[i], []).append(i)
+    if todo:
+        texts_todo = [texts[rows[0]] for rows in todo.values()]
+        fresh = embedder.get().encode(texts_todo, batch_size=batch_size, show_progress_bar=False)
+        for (key, rows), vec in zip(todo.items(), fresh):
+            query_cache.put(key, vec)
+            for i in rows:
+                vecs[i] = vec
+
+    return np.asarray(vecs, dtype="float32")
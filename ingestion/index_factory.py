@@ -0,0 +1,221 @@
+import math
+import os
+import numpy as np
+
+from ingestion.numpy_index import VECTORS_FILE, NumpyIndex, VectorsWriter
+
+try:
+    import faiss
+except ImportError:  # NumPy-only environments: "numpy" index type only
+    faiss = None
+
+# "flat" first: the exact index other types are benchmarked against.
+INDEX_TYPES = ("flat", "fp16", "sq8", "ivf", "hnsw", "ivfpq", "numpy")
+
+INDEX_FILE = "index.faiss"
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+PQ_M = 16        # sub-quantizers; must divide the embedding dim (384)
+PQ_BITS = 8      # lowered by pq_bits() when there are too few vectors to train
+
+# Scalar-quantized flat indexes, searched by inner product.
+SQ_TYPES = {"fp16": "QT_fp16", "sq8": "QT_8bit"}
+
+# Types whose training depends on the data (int8 ranges, IVF centroids).
+# IndexBuilder trains them on the first TRAIN_ROWS vectors.
+TRAINED_TYPES = ("sq8", "ivf", "ivfpq")
+TRAIN_ROWS = 20000
+
+
+def default_nlist(n):
+    """
+    ~4*sqrt(n) inverted lists, capped so every list still gets
+    enough training points (faiss wants ~39 per centroid).
+    """
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def pq_bits(n):
+    """
+    Bits per PQ code for n training vectors: PQ_BITS, lowered so every
+    sub-quantizer's 2**bits centroids still get a training point each
+    (faiss refuses to train 256 centroids on fewer than 256 points).
+    """
+    if n < 2:
+        raise ValueError(f"ivfpq needs at least 2 vectors to train on, got {n}")
+    return min(PQ_BITS, int(math.log2(n)))
+
+
+def normalize(vectors):
+    """
+    Contiguous float32 copy of vectors with unit-length rows, so inner
+    product is cosine similarity and L2 ranks the same way.
+    """
+    vectors = np.array(vectors, dtype="float32", order="C")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.maximum(norms, 1e-12)
+    return vectors
+
+
+def make_index(index_type, vectors, nlist=None):
+    """
+    Build, train and fill an index of the given type over normalized
+    vectors. Returns (index, info) where info is the JSON-able
+    description stored next to the index so retrieval knows how to
+    search it ("metric" is "ip" or "l2").
+    """
+    n, d = vectors.shape
+    if index_type == "numpy":
+        index = NumpyIndex.from_vectors(vectors)
+        return index, _info(index_type, d, n, "ip")
+
+    index, info = _empty_index(index_type, d, n, nlist)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index, info
+
+
+def _info(index_type, d, n, metric="l2"):
+    return {"index_type": index_type, "dim": d, "count": n, "normalized": True, "metric": metric}
+
+
+def _empty_index(index_type, d, n, nlist=None):
+    """
+    Untrained, empty faiss index of the given type for about n vectors
+    of dim d, and its info.
+    """
+    if faiss is None:
+        raise ImportError(f"faiss is required for index type {index_type!r}; use 'numpy'")
+
+    info = _info(index_type, d, n)
+
+    if index_type in SQ_TYPES:
+        qtype = getattr(faiss.ScalarQuantizer, SQ_TYPES[index_type])
+        index = faiss.IndexScalarQuantizer(d, qtype, faiss.METRIC_INNER_PRODUCT)
+        info["metric"] = "ip"
+
+    elif index_type == "flat":
+        index = faiss.IndexFlatL2(d)
+
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        info["hnsw_m"] = HNSW_M
+
+    elif index_type in ("ivf", "ivfpq"):
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatL2(d)
+        if index_type == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist)
+        else:
+            bits = pq_bits(n)
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, PQ_M, bits)
+            info["pq_m"] = PQ_M
+            info["pq_bits"] = bits
+        info["nlist"] = nlist
+
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    return index, info
+
+
+class IndexBuilder:
+    """
+    make_index for vectors that arrive in batches, writing into the
+    folder path on finish(). TRAINED_TYPES buffer their first
+    train_rows vectors to train on (IVF sizes nlist from that sample);
+    the "numpy" type streams rows to disk as they come.
+    """
+
+    def __init__(self, path, index_type, nlist=None, train_rows=TRAIN_ROWS):
+        self.path = path
+        self.index_type = index_type
+        self.nlist = nlist
+        self.train_rows = train_rows
+        self.index = None
+        self.info = None
+        self._pending = []
+
+    def add(self, vectors):
+        if self.index is None:
+            self._pending.append(vectors)
+            if (
+                self.index_type in TRAINED_TYPES
+                and sum(len(v) for v in self._pending) < self.train_rows
+            ):
+                return
+            self._start(np.vstack(self._pending))
+            self._pending = []
+        else:
+            self.index.add(vectors)
+
+    def _start(self, sample):
+        n, d = sample.shape
+        if self.index_type == "numpy":
+            self.index = VectorsWriter(os.path.join(self.path, VECTORS_FILE))
+            self.info = _info(self.index_type, d, n, "ip")
+        else:
+            self.index, self.info = _empty_index(self.index_type, d, n, self.nlist)
+        if not self.index.is_trained:
+            self.index.train(sample)
+        self.index.add(sample)
+
+    def finish(self):
+        """
+        Write the index and return its info.
+        """
+        if self._pending:
+            self._start(np.vstack(self._pending))
+            self._pending = []
+        if self.index is None:
+            raise ValueError("IndexBuilder.finish() called before any vectors were added")
+
+        self.info["count"] = int(self.index.ntotal)
+        if isinstance(self.index, VectorsWriter):
+            self.index.close()
+            _remove_stale(self.path, INDEX_FILE)
+        else:
+            write_index(self.index, self.path)
+        return self.info
+
+
+def write_index(index, path):
+    """
+    Write index into the folder path (index.faiss, or vectors.npy for
+    a NumpyIndex), replacing the other kind if a previous build left it.
+    The file is written aside and renamed into place.
+    """
+    if isinstance(index, NumpyIndex):
+        index.write(os.path.join(path, VECTORS_FILE))
+        _remove_stale(path, INDEX_FILE)
+    else:
+        file_path = os.path.join(path, INDEX_FILE)
+        faiss.write_index(index, file_path + ".tmp")
+        os.replace(file_path + ".tmp", file_path)
+        _remove_stale(path, VECTORS_FILE)
+
+
+def _remove_stale(path, name):
+    stale = os.path.join(path, name)
+    if os.path.exists(stale):
+        os.remove(stale)
+
+
+def index_path(path):
+    """
+    The index file in folder path this process can load, or None.
+    """
+    if faiss is not None and os.path.exists(os.path.join(path, INDEX_FILE)):
+        return os.path.join(path, INDEX_FILE)
+    if os.path.exists(os.path.join(path, VECTORS_FILE)):
+        return os.path.join(path, VECTORS_FILE)
+    return None
+
+
+def read_index(file_path):
+    if file_path.endswith(".npy"):
+        return NumpyIndex.load(file_path)
+    return faiss.read_index(file_path)
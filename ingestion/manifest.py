@@ -0,0 +1,58 @@
+"""
+Content hashes that decide what an index rebuild can skip.
+
+Each built book folder gets a manifest.json recording the hash of its
+source pages, the chunker config, the embedding model and the index
+settings. A book whose manifest is unchanged is not rebuilt.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = "manifest.json"
+
+
+def hash_text(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def hash_pages(pages):
+    h = hashlib.sha256()
+    for p in pages:
+        update_pages_hash(h, p)
+    return h.hexdigest()
+
+
+def update_pages_hash(h, page):
+    """
+    Feed one page into a hashlib.sha256() object, so hash_pages can be
+    computed over streamed pages.
+    """
+    h.update(f"{page['page']}\0{page['chapter']}\0{page['text']}\0".encode("utf-8"))
+
+
+def file_digest(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(block)
+            if not data:
+                break
+            h.update(data)
+    return h.hexdigest()
+
+
+def read_manifest(book_path):
+    path = os.path.join(book_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(book_path, manifest):
+    # Write aside and rename: a truncated manifest must never be read.
+    path = os.path.join(book_path, MANIFEST_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,86 @@
+"""
+Inference backend for the embedding and cross-encoder models.
+
+MODEL_BACKEND=torch (default) runs the usual PyTorch models.
+MODEL_BACKEND=onnx runs them as int8 dynamically-quantized ONNX Runtime
+sessions; each model is exported and quantized once into ONNX_MODEL_DIR
+on first use. Needs sentence-transformers >= 4.1 with the [onnx] extra.
+
+    MODEL_BACKEND=onnx ONNX_INTRA_OP_THREADS=4 streamlit run streamlit_app.py
+"""
+import os
+
+BACKENDS = ("torch", "onnx")
+
+BACKEND = os.getenv("MODEL_BACKEND", "torch")
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "models/onnx")
+# avx2 runs on any recent x86 CPU; use avx512_vnni / arm64 where available.
+ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "avx2")
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+
+def _model_class(kind):
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+    if kind == "embedding":
+        return SentenceTransformer
+    if kind == "cross-encoder":
+        return CrossEncoder
+    raise ValueError(f"Unknown model kind: {kind}")
+
+
+def onnx_path(name):
+    return os.path.join(ONNX_MODEL_DIR, name.replace("/", "__"))
+
+
+def onnx_file_name(quantization=ONNX_QUANTIZATION):
+    return f"onnx/model_qint8_{quantization}.onnx"
+
+
+def export_onnx(name, kind, quantization=ONNX_QUANTIZATION):
+    """
+    Export `name` to ONNX and write an int8 dynamically quantized copy
+    next to it. Returns the export directory.
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    out = onnx_path(name)
+    model = _model_class(kind)(name, backend="onnx")
+    model.save_pretrained(out)
+    export_dynamic_quantized_onnx_model(model, quantization, out)
+    return out
+
+
+def _session_options(threads):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    return options
+
+
+def load_model(name, kind, backend=BACKEND, threads=ONNX_INTRA_OP_THREADS):
+    """
+    A SentenceTransformer ("embedding") or CrossEncoder ("cross-encoder")
+    on the requested backend.
+    """
+    cls = _model_class(kind)
+    if backend == "torch":
+        return cls(name)
+    if backend != "onnx":
+        raise ValueError(f"Unknown backend: {backend} (expected one of {BACKENDS})")
+
+    path = onnx_path(name)
+    if not os.path.exists(os.path.join(path, onnx_file_name())):
+        export_onnx(name, kind)
+
+    return cls(
+        path,
+        backend="onnx",
+        model_kwargs={
+            "file_name": onnx_file_name(),
+            "provider": "CPUExecutionProvider",
+            "session_options": _session_options(threads),
+        },
+    )
@@ -0,0 +1,114 @@
+"""
+Pure-NumPy exact inner-product index over L2-normalized float16
+vectors, for environments without FAISS.
+
+Stored as a single contiguous vectors.npy, memory-mapped at load. The
+search mirrors faiss' Index.search(q, k) -> (distances, ids), with
+distances reported as squared L2 between unit vectors (2 - 2 * cos)
+so callers can treat every index type alike.
+"""
+import os
+import shutil
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+
+# Rows converted to float32 per matmul block (NumPy has no fp16 BLAS).
+BLOCK_ROWS = 16384
+
+
+class NumpyIndex:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        """
+        Index of already L2-normalized float32 vectors, stored as float16.
+        """
+        return cls(np.ascontiguousarray(vectors, dtype=np.float16))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls(np.load(path, mmap_mode="r" if mmap else None))
+
+    def write(self, path):
+        # Write aside and rename: a live NumpyIndex may have path mmapped.
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, self.vectors)
+        os.replace(path + ".tmp", path)
+
+    def reconstruct_n(self, start, n):
+        return np.asarray(self.vectors[start:start + n], dtype=np.float32)
+
+    def scores(self, q, lo=0, hi=None):
+        """
+        Inner products of queries q (nq, d) with rows [lo, hi).
+        """
+        hi = self.ntotal if hi is None else min(hi, self.ntotal)
+        q = np.asarray(q, dtype=np.float32)
+        out = np.empty((len(q), max(hi - lo, 0)), dtype=np.float32)
+        for start in range(lo, hi, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, hi)
+            block = np.asarray(self.vectors[start:end], dtype=np.float32)
+            out[:, start - lo:end - lo] = q @ block.T
+        return out
+
+    def search(self, q, k, lo=0, hi=None):
+        """
+        Top-k rows per query in [lo, hi), best first; ids are global
+        row numbers, padded with -1 when fewer than k rows exist.
+        """
+        sims = self.scores(q, lo, hi)
+        nq, n = sims.shape
+        dists = np.full((nq, k), np.inf, dtype=np.float32)
+        ids = np.full((nq, k), -1, dtype=np.int64)
+        kk = min(k, n)
+        if kk == 0:
+            return dists, ids
+
+        part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+        top = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-top, axis=1, kind="stable")
+        part = np.take_along_axis(part, order, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        dists[:, :kk] = 2.0 - 2.0 * top
+        ids[:, :kk] = part + lo
+        return dists, ids
+
+
+class VectorsWriter:
+    """
+    Append float16 rows to a vectors.npy whose length is not known up
+    front: rows go to a raw side file, and close() writes the .npy
+    header and copies them behind it block by block.
+    """
+
+    is_trained = True
+
+    def __init__(self, path):
+        self.path = path
+        self.ntotal = 0
+        self.d = 0
+        self._raw = open(path + ".rows", "wb")
+
+    def add(self, vectors):
+        rows = np.ascontiguousarray(vectors, dtype=np.float16)
+        self.d = rows.shape[1]
+        self._raw.write(rows.tobytes())
+        self.ntotal += len(rows)
+
+    def close(self):
+        self._raw.close()
+        header = {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(np.float16)),
+            "fortran_order": False,
+            "shape": (self.ntotal, self.d),
+        }
+        with open(self.path + ".tmp", "wb") as out, open(self._raw.name, "rb") as rows:
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(rows, out, 1 << 20)
+        os.remove(self._raw.name)
+        os.replace(self.path + ".tmp", self.path)
@@ -1,13 +1,54 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
 
+def iter_pages(path):
+    """
+    Yield the PDF's pages one at a time, in order; only the current
+    page's text is held in memory.
+    """
+    with fitz.open(path) as doc:
+        for i, page in enumerate(doc):
+            yield {
+                "page": i + 1,          # HUMAN page number
+                "text": page.get_text()
+            }
+
+
 def load_pdf(path):
-    doc = fitz.open(path)
-    pages = []
+    return list(iter_pages(path))
+
+
+def load_pdf_range(path, start, end):
+    """
+    Pages [start, end) (0-based) of the PDF, same format as load_pdf.
+    """
+    with fitz.open(path) as doc:
+        return [
+            {"page": i + 1, "text": doc[i].get_text()}
+            for i in range(start, min(end, doc.page_count))
+        ]
 
-    for i, page in enumerate(doc):
-        pages.append({
-            "page": i + 1,          # HUMAN page number
-            "text": page.get_text()
-        })
 
-    return pages
\ No newline at end of file
+def _load_range(args):
+    return load_pdf_range(*args)
+
+
+def load_pdf_parallel(path, workers=None, pages_per_task=100):
+    """
+    load_pdf, with page ranges parsed in a process pool.
+    Pages come back in document order.
+    """
+    with fitz.open(path) as doc:
+        n_pages = doc.page_count
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        return load_pdf(path)
+
+    ranges = [(path, s, s + pages_per_task) for s in range(0, n_pages, pages_per_task)]
+    pages = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(_load_range, ranges):
+            pages.extend(part)
+    return pages
@@ -17,7 +17,14 @@ def assign_book(page_num):
 
 
 def assign_structure(pages):
-    structured = []
+    return list(iter_structure(pages))
+
+
+def iter_structure(pages):
+    """
+    Lazy assign_structure: tag each page of the (possibly streamed)
+    pages with its book and chapter as it comes.
+    """
     current_chapter = None
 
     for p in pages:
@@ -30,11 +37,9 @@ def assign_structure(pages):
                 current_chapter = line.strip()
                 break
 
-        structured.append({
+        yield {
             "book": book,
             "chapter": current_chapter,
             "page": p["page"],
             "text": text
-        })
-
-    return structured
\ No newline at end of file
+        }
\ No newline at end of file
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from rag.gemini_client import GENERATION_CONFIG, MODEL_NAME, stream_generate
+from rag.prompt import PROMPT_VERSION
+
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", ".cache/answers.sqlite")
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+
+def answer_key(prompt, model_name=MODEL_NAME, generation_config=GENERATION_CONFIG):
+    """
+    Hash of everything that determines the answer. The prompt already
+    embeds the question and the retrieved chunks.
+    """
+    raw = json.dumps(
+        {
+            "prompt_version": PROMPT_VERSION,
+            "model": model_name,
+            "config": generation_config,
+            "prompt": prompt,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def model_key(model):
+    """
+    Name the cache key uses for this model, so e.g. the offline stub
+    never serves (or overwrites) real Gemini answers.
+    """
+    name = getattr(model, "model_name", None) or MODEL_NAME
+    # GenerativeModel reports "models/<name>"
+    return name.split("/")[-1]
+
+
+class AnswerCache:
+    """
+    Persistent SQLite answer cache with TTL and LRU-by-last-use
+    eviction once max_entries is exceeded.
+
+    Gemini runs at temperature 0 / top_k 1, so a given prompt and
+    config always produce the same answer; a hit skips the LLM call.
+    """
+
+    def __init__(self, path=ANSWER_CACHE_PATH, ttl=ANSWER_CACHE_TTL,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    answer TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers(last_used)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call: Streamlit runs each
+        # session in its own thread and sqlite connections are per-thread.
+        db = sqlite3.connect(self.path, timeout=5)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT answer, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl:
+                db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                row = None
+            if row:
+                db.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def put(self, key, answer):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, created, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, answer, now, now),
+            )
+            db.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+            (count,) = db.execute("SELECT COUNT(*) FROM answers").fetchone()
+            if count > self.max_entries:
+                db.execute(
+                    "DELETE FROM answers WHERE key IN "
+                    "(SELECT key FROM answers ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def stats(self):
+        with self._connect() as db:
+            (size,) = db.execute("SELECT COUNT(*) FROM answers").fetchone()
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": size}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache()
+        return _cache
+
+
+def stream_answer(model, prompt, timings=None):
+    """
+    model.generate_content(prompt, stream=True), answered from the
+    cache when the same prompt was already sent with the same model
+    config: yields the answer piece by piece, or in one piece on a hit.
+    The full answer is cached once the stream completes, unless empty.
+    """
+    cache = get_answer_cache()
+    key = answer_key(prompt, model_key(model))
+
+    answer = cache.get(key)
+    if answer is not None:
+        if timings is not None:
+            timings.update(ttft_s=0.0, total_s=0.0, cached=True)
+        yield answer
+        return
+
+    pieces = []
+    for piece in stream_generate(model, prompt, timings):
+        pieces.append(piece)
+        yield piece
+
+    answer = "".join(pieces).strip()
+    if answer:
+        cache.put(key, answer)
@@ -0,0 +1,103 @@
+"""
+Answer a file of questions offline.
+
+Input is JSONL, one {"question": "...", "id": ...} per line ("id" is
+optional). Output is JSONL in input order with the answer, its
+sources, whether it was cached, elapsed seconds and any error.
+
+    python -m rag.batch questions.jsonl -o answers.jsonl --workers 8
+    python -m rag.batch questions.jsonl --stub
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from rag.gemini_client import get_client
+from rag.pipeline import answer_question, sources
+
+
+def read_questions(path):
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            item.setdefault("id", n)
+            items.append(item)
+    return items
+
+
+async def run_batch(items, model, workers=4, use_reranker=True, top_n=5):
+    """
+    Answer every item with at most `workers` questions in flight.
+    Results come back in input order; failures are recorded, not raised.
+    """
+    sem = asyncio.Semaphore(workers)
+
+    async def one(item):
+        async with sem:
+            t0 = time.perf_counter()
+            out = {"id": item["id"], "question": item["question"]}
+            try:
+                result = await answer_question(
+                    item["question"], model=model, use_reranker=use_reranker, top_n=top_n
+                )
+                out.update(
+                    answer=result["answer"],
+                    sources=sources(result["chunks"]),
+                    cached=result["cached"],
+                    similar_to=result["similar_to"],
+                    error=None,
+                )
+            except Exception as e:
+                out.update(answer=None, sources=[], cached=False, similar_to=None,
+                           error=f"{type(e).__name__}: {e}")
+            out["elapsed_s"] = round(time.perf_counter() - t0, 3)
+            return out
+
+    return await asyncio.gather(*(one(item) for item in items))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions")
+    parser.add_argument("questions", help="JSONL file with a 'question' field per line")
+    parser.add_argument("-o", "--output", help="Output JSONL (default: stdout)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--no-rerank", action="store_true")
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub LLM")
+    args = parser.parse_args()
+
+    items = read_questions(args.questions)
+    model = get_client("stub" if args.stub else None)
+
+    t0 = time.perf_counter()
+    results = asyncio.run(run_batch(
+        items, model, workers=args.workers, use_reranker=not args.no_rerank, top_n=args.top_n
+    ))
+    elapsed = time.perf_counter() - t0
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for r in results:
+            out.write(json.dumps(r, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    errors = sum(1 for r in results if r["error"])
+    print(
+        f"{len(results)} questions in {elapsed:.1f}s "
+        f"({len(results) / max(elapsed, 1e-9):.2f}/s), {errors} errors",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,35 @@
 import os
-import google.generativeai as genai
+import time
+import logging
+from common.tracing import record
 
+log = logging.getLogger(__name__)
 
-def get_client():
+MODEL_NAME = "gemini-2.5-flash"
+
+# "gemini", or "stub" for the offline StubModel (no API key / network).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+GENERATION_CONFIG = {
+    "temperature": 0.0,
+    "top_p": 1.0,
+    "top_k": 1,
+    "max_output_tokens": 2048,
+}
+
+
+def get_client(backend=None):
     """
     Returns a Gemini GenerativeModel instance (NOT the module).
     This is the ONLY correct way to use Gemini with Streamlit Cloud.
+
+    backend="stub" (or LLM_BACKEND=stub) returns the offline StubModel.
     """
+    if (backend or LLM_BACKEND) == "stub":
+        from rag.stub_client import StubModel
+        return StubModel()
+
+    import google.generativeai as genai
 
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
@@ -15,13 +38,70 @@ def get_client():
     genai.configure(api_key=api_key)
 
     model = genai.GenerativeModel(
-        model_name="gemini-2.5-flash",
-        generation_config={
-            "temperature": 0.0,
-            "top_p": 1.0,
-            "top_k": 1,
-            "max_output_tokens": 2048,
-        },
+        model_name=MODEL_NAME,
+        generation_config=GENERATION_CONFIG,
     )
 
-    return model
\ No newline at end of file
+    return model
+
+
+def response_text(response):
+    """
+    Text of a Gemini response or streamed chunk. Unlike response.text
+    this never raises: a chunk without parts (a safety block, a
+    finish-only chunk) has no text.
+    """
+    candidates = getattr(response, "candidates", None)
+    if candidates is None:  # StubModel responses only have .text
+        return getattr(response, "text", "") or ""
+    if not candidates:
+        return ""
+    parts = getattr(candidates[0].content, "parts", None) or []
+    return "".join(getattr(p, "text", "") or "" for p in parts)
+
+
+def finish_reason(response):
+    """
+    Name of the first candidate's finish reason ("STOP", "SAFETY", ...),
+    or None if the response does not carry one yet.
+    """
+    candidates = getattr(response, "candidates", None)
+    reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+    if not reason:
+        return None
+    return getattr(reason, "name", str(reason))
+
+
+def stream_generate(model, prompt, timings=None):
+    """
+    Yield answer text pieces as Gemini streams them.
+
+    Time-to-first-token and total time are logged separately and, if
+    a dict is passed as `timings`, stored in it as ttft_s / total_s,
+    along with the finish reason. A stream that stops early (e.g. on
+    a safety block) ends the answer instead of raising mid-stream.
+    """
+    start = time.perf_counter()
+    ttft = None
+    reason = None
+
+    for chunk in model.generate_content(prompt, stream=True):
+        reason = finish_reason(chunk) or reason
+        text = response_text(chunk)
+        if not text:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - start
+            log.info("gemini ttft=%.3fs", ttft)
+            record("llm_ttft", ttft)
+        yield text
+
+    total = time.perf_counter() - start
+    record("generate_content", total)
+    log.info("gemini total=%.3fs ttft=%s", total, f"{ttft:.3f}s" if ttft is not None else "n/a")
+    if reason not in (None, "STOP", "MAX_TOKENS"):
+        log.warning("gemini stream finished early: %s", reason)
+    if timings is not None:
+        timings["ttft_s"] = ttft
+        timings["total_s"] = total
+        timings["finish_reason"] = reason
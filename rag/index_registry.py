@@ -0,0 +1,198 @@
+import hashlib
+import os
+import json
+import pickle
+import threading
+import numpy as np
+from ingestion.chunk_store import STORE_DIR, ChunkStore, store_exists, store_paths
+from ingestion.bm25 import BM25_FILE, BM25Index
+from ingestion.centroids import CENTROIDS_FILE, Centroids
+from ingestion.index_factory import index_path as find_index, read_index
+from common.tracing import span
+
+VECTOR_BASE = "vector_store"
+CORPUS_DIR = "_corpus"
+
+META_FILE = "meta.pkl"   # legacy pickled list of chunk dicts
+INFO_FILE = "info.json"
+
+# Indexes built before info.json existed are exact flat indexes.
+DEFAULT_INFO = {"index_type": "flat"}
+
+
+class BookIndex:
+    """
+    One book's FAISS index + chunk metadata, plus the file signature
+    they were loaded from. metadata is a ChunkStore, or a plain list
+    for folders still on meta.pkl.
+    """
+
+    def __init__(self, name, index, metadata, signature, info, bm25=None, centroids=None):
+        self.name = name
+        self.index = index
+        self.metadata = metadata
+        self.signature = signature
+        self.info = info
+        self.bm25 = bm25
+        self.centroids = centroids
+
+
+class CorpusIndex:
+    """
+    Single index over every book. Row i of the index is metadata[i];
+    the store's interned book/chapter ids map it back to its book.
+    """
+
+    def __init__(self, name, index, metadata, signature, info, bm25=None, centroids=None):
+        self.name = name
+        self.index = index
+        self.info = info
+        self.bm25 = bm25
+        self.centroids = centroids
+        self.metadata = metadata
+        self.books = metadata.books
+        self.chapters = metadata.chapters
+        self.book_ids = np.asarray(metadata.book_ids)
+        self.chapter_ids = metadata.chapter_ids
+        self.book_ranges = metadata.book_ranges()
+        self.signature = signature
+
+
+def _signature(paths):
+    sig = []
+    for p in paths:
+        st = os.stat(p)
+        sig.append((st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+class IndexRegistry:
+    """
+    Process-lifetime cache of per-book indexes.
+
+    Every Streamlit session in the same server process shares one
+    registry, so each book is read from disk once and only reloaded
+    when its index or chunk files change (mtime or size).
+    """
+
+    def __init__(self, base=VECTOR_BASE):
+        self.base = base
+        self._books = {}
+        self._lock = threading.Lock()
+        self._stats = {"warm": 0, "cold": 0, "reloads": 0}
+
+    def _load(self, name, cls=BookIndex):
+        book_path = os.path.join(self.base, name)
+        index_path = find_index(book_path)
+        store_path = os.path.join(book_path, STORE_DIR)
+        meta_path = os.path.join(book_path, META_FILE)
+        info_path = os.path.join(book_path, INFO_FILE)
+        bm25_path = os.path.join(book_path, BM25_FILE)
+        centroids_path = os.path.join(book_path, CENTROIDS_FILE)
+
+        if store_exists(store_path):
+            meta_paths = store_paths(store_path)
+        elif os.path.exists(meta_path) and cls is BookIndex:
+            meta_paths = [meta_path]
+        else:
+            meta_paths = None
+
+        if index_path is None or not meta_paths:
+            self._books.pop(name, None)
+            return None
+
+        paths = [index_path] + meta_paths
+        for optional in (info_path, bm25_path, centroids_path):
+            if os.path.exists(optional):
+                paths.append(optional)
+        signature = _signature(paths)
+        cached = self._books.get(name)
+        if cached and cached.signature == signature:
+            self._stats["warm"] += 1
+            return cached
+
+        with span("index_load"):
+            index = read_index(index_path)
+            if store_exists(store_path):
+                metadata = ChunkStore(store_path)
+            else:
+                with open(meta_path, "rb") as f:
+                    metadata = pickle.load(f)
+            info = dict(DEFAULT_INFO)
+            if os.path.exists(info_path):
+                with open(info_path) as f:
+                    info.update(json.load(f))
+            bm25 = BM25Index(bm25_path) if os.path.exists(bm25_path) else None
+            centroids = Centroids(centroids_path) if os.path.exists(centroids_path) else None
+
+        self._stats["cold"] += 1
+        if cached:
+            self._stats["reloads"] += 1
+
+        book = cls(name, index, metadata, signature, info, bm25, centroids)
+        self._books[name] = book
+        return book
+
+    def books(self):
+        """
+        Return every available BookIndex, loading or reloading from
+        disk only where the files changed since the last call.
+        """
+        if not os.path.isdir(self.base):
+            return []
+
+        names = sorted(
+            n for n in os.listdir(self.base)
+            if n != CORPUS_DIR and not n.startswith(".")
+        )
+        with self._lock:
+            for stale in set(self._books) - set(names) - {CORPUS_DIR}:
+                del self._books[stale]
+
+            loaded = []
+            for name in names:
+                book = self._load(name)
+                if book:
+                    loaded.append(book)
+            return loaded
+
+    def corpus(self):
+        """
+        Return the unified CorpusIndex if one was built, else None.
+        """
+        with self._lock:
+            return self._load(CORPUS_DIR, CorpusIndex)
+
+    def signature(self):
+        """
+        Short hash of the file signatures of the indexes retrieval would
+        use right now (the corpus if built, else every book), checked
+        against disk first. It changes whenever an index is rebuilt.
+        """
+        corpus = self.corpus()
+        entries = [corpus] if corpus is not None else self.books()
+        raw = repr([(e.name, e.signature) for e in entries])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, loaded=len(self._books))
+
+    def clear(self):
+        with self._lock:
+            self._books.clear()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(base=VECTOR_BASE):
+    """
+    Shared registry for this process.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None or _registry.base != base:
+            _registry = IndexRegistry(base)
+        return _registry
@@ -0,0 +1,287 @@
+"""
+Async question-answering pipeline: retrieve -> rerank -> prompt -> LLM.
+
+CPU-bound steps (embedding, FAISS / BM25 search, filtering, reranking,
+prompt packing) run on thread pools, so the event loop never blocks and
+many questions can be in flight on one event loop / server process.
+Within one question the stages run in order, since each needs the
+previous one's output; only the per-book searches fan out concurrently.
+The Gemini call goes through the async client behind a concurrency limit.
+
+    answer = asyncio.run(answer_question("Who was the heir of Slytherin?"))
+
+build_context() is the synchronous retrieval half, shared by the
+Streamlit apps, which stream the LLM call themselves.
+"""
+import asyncio
+import contextvars
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from common.tracing import span, trace
+from ingestion.embeddings import embed_query
+from rag.answer_cache import answer_key, get_answer_cache, model_key
+from rag.gemini_client import get_client, response_text
+from rag.index_registry import VECTOR_BASE, get_registry
+from rag.prompt import CONTEXT_TOKEN_BUDGET, PROMPT_VERSION, build_prompt, pack_context
+from rag.reranker import RERANK_TOP_M, rerank
+from rag.retriever import (
+    best_first, filter_chunks, retrieve, retrieve_unified, routed, search_book,
+)
+from rag.router import ROUTING_ENABLED
+from rag.semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache
+
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "60"))
+# Past this, the reranked context is abandoned for the lexically
+# filtered one.
+RERANK_TIMEOUT_S = float(os.getenv("RERANK_TIMEOUT_S", "10"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RAG_WORKERS", "0")) or min(32, (os.cpu_count() or 1) + 4),
+    thread_name_prefix="rag",
+)
+# Reranking gets its own pool: a predict call cannot be interrupted, so
+# one that overran RERANK_TIMEOUT_S keeps its thread until it finishes,
+# and must not hold slots the retrieval / prompt stages need.
+_rerank_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RERANK_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 2),
+    thread_name_prefix="rag-rerank",
+)
+
+# asyncio.Semaphore is bound to one event loop; keep one per loop.
+_llm_semaphores = weakref.WeakKeyDictionary()
+
+
+def _llm_semaphore():
+    loop = asyncio.get_running_loop()
+    sem = _llm_semaphores.get(loop)
+    if sem is None:
+        sem = _llm_semaphores[loop] = asyncio.Semaphore(LLM_CONCURRENCY)
+    return sem
+
+
+async def _run(fn, *args, **kwargs):
+    return await _run_in(_executor, fn, *args, **kwargs)
+
+
+async def _run_in(executor, fn, *args, **kwargs):
+    # Carry the current trace over to the worker thread.
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(ctx.run, fn, *args, **kwargs))
+
+
+def select_context(question, chunks, use_reranker=True, top_n=5):
+    """
+    The retrieved chunks that go into the prompt, best first: the
+    cross-encoder's top_n (of the first stage's best RERANK_TOP_M), or
+    the lexically filtered set when reranking is off.
+    """
+    if use_reranker:
+        return rerank(question, chunks, top_n, RERANK_TOP_M)
+    return best_first(filter_chunks(question, chunks))
+
+
+def _prompt(question, chunks):
+    """
+    Token-budgeted excerpts and the prompt built from them.
+    """
+    context = pack_context(chunks)
+    return context, build_prompt(question, context, pack=False)
+
+
+def build_context(question, use_reranker=True, k_per_book=12, top_n=5):
+    """
+    Synchronous retrieve + context selection + prompt.
+    Returns (context excerpts, prompt); ([], None) if nothing was found.
+    """
+    chunks = retrieve(question, k_per_book)
+    if not chunks:
+        return [], None
+    return _prompt(question, select_context(question, chunks, use_reranker, top_n))
+
+
+def _namespace(model, use_reranker, top_n, k_per_book):
+    """
+    Everything besides the question that shapes an answer, including
+    the signature of the loaded indexes, so answers cached before a
+    rebuild are not reused after the registry reloads it.
+    """
+    return (
+        f"{model_key(model)}|prompt=v{PROMPT_VERSION}|budget={CONTEXT_TOKEN_BUDGET}"
+        f"|rerank={bool(use_reranker)}|top_m={RERANK_TOP_M}|top_n={top_n}|k={k_per_book}"
+        f"|index={get_registry(VECTOR_BASE).signature()}"
+    )
+
+
+def lookup_answer(question, model, use_reranker=True, top_n=5, k_per_book=12, q_vec=None):
+    """
+    A cached answer to a near-duplicate of question (see
+    rag.semantic_cache), or None. The hit carries the cached question,
+    its answer and context excerpts, and the similarity.
+    """
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    with span("semantic_cache"):
+        if q_vec is None:
+            q_vec = embed_query(question)
+        return semantic_cache.get(q_vec, _namespace(model, use_reranker, top_n, k_per_book))
+
+
+def remember_answer(question, model, context, answer, use_reranker=True, top_n=5,
+                    k_per_book=12, q_vec=None):
+    """
+    Make answer reusable for near-duplicates of question.
+    """
+    if not SEMANTIC_CACHE_ENABLED or not answer:
+        return
+    if q_vec is None:
+        q_vec = embed_query(question)
+    semantic_cache.put(
+        q_vec, _namespace(model, use_reranker, top_n, k_per_book), question, answer, context
+    )
+
+
+async def retrieve_async(question, k_per_book=12, hybrid=True, q_vec=None, route=ROUTING_ENABLED):
+    """
+    retrieve(), with each (routed) book searched concurrently on the
+    thread pool (FAISS releases the GIL while it searches).
+    """
+    registry = get_registry(VECTOR_BASE)
+    with span("retrieve"):
+        if q_vec is None:
+            q_vec, corpus = await asyncio.gather(
+                _run(embed_query, question),
+                _run(registry.corpus),
+            )
+        else:
+            corpus = await _run(registry.corpus)
+
+        if corpus is not None:
+            return await _run(
+                retrieve_unified, corpus, question, q_vec, k_per_book, hybrid=hybrid, route=route
+            )
+
+        books = await _run(registry.books)
+        if route:
+            books = await _run(routed, books, q_vec)
+        parts = await asyncio.gather(*(
+            _run(search_book, book, question, q_vec, k_per_book, hybrid=hybrid)
+            for book in books
+        ))
+        return [hit for part in parts for hit in part]
+
+
+async def generate_async(model, prompt, timeout=LLM_TIMEOUT_S):
+    """
+    Cached Gemini call through the async client, at most
+    LLM_CONCURRENCY in flight per event loop. Returns (answer, cached).
+    """
+    cache = get_answer_cache()
+    key = answer_key(prompt, model_key(model))
+
+    answer = await _run(cache.get, key)
+    if answer is not None:
+        return answer, True
+
+    sem = _llm_semaphore()
+    with span("llm_queue"):
+        await sem.acquire()
+    try:
+        with span("generate_content"):
+            response = await asyncio.wait_for(model.generate_content_async(prompt), timeout)
+    finally:
+        sem.release()
+    answer = response_text(response).strip()
+
+    if answer:  # don't cache a blocked or empty response
+        await _run(cache.put, key, answer)
+    return answer, False
+
+
+async def answer_question(question, model=None, k_per_book=12, use_reranker=True,
+                          top_n=5, timeout=LLM_TIMEOUT_S):
+    """
+    Answer one question end to end. Returns a dict with the answer, the
+    excerpts used as context (see pack_context), whether the answer came
+    from a cache and, for a near-duplicate hit, the question it matched.
+
+    A near-duplicate of an already answered question is served from the
+    semantic cache without retrieval, reranking or an LLM call.
+
+    Every CPU stage runs off the event loop; reranking runs on its own
+    pool, and if it overruns RERANK_TIMEOUT_S the lexically filtered
+    context is used instead (the overrunning predict call still
+    finishes in the background, and its scores land in the pair
+    cache). Cancelling the returned coroutine cancels the pending LLM
+    call.
+
+    Each call is traced (see common.tracing): stage timings are
+    logged as one JSON line and feed the rolling percentiles.
+    """
+    with trace("answer_question", question=question) as t:
+        model = model or await _run(get_client)
+        q_vec = await _run(embed_query, question)
+
+        hit = await _run(lookup_answer, question, model, use_reranker, top_n, k_per_book, q_vec)
+        if hit is not None:
+            t.fields.update(cached=True, similar_to=hit["question"])
+            return {
+                "question": question, "answer": hit["answer"], "chunks": hit["chunks"],
+                "cached": True, "similar_to": hit["question"],
+            }
+
+        chunks = await retrieve_async(question, k_per_book, q_vec=q_vec)
+        if not chunks:
+            return {
+                "question": question, "answer": None, "chunks": [],
+                "cached": False, "similar_to": None,
+            }
+
+        selected = None
+        if use_reranker:
+            try:
+                selected = await asyncio.wait_for(
+                    _run_in(_rerank_executor, rerank, question, chunks, top_n, RERANK_TOP_M),
+                    RERANK_TIMEOUT_S,
+                )
+            except asyncio.TimeoutError:
+                t.fields["rerank_timeout"] = True
+        if selected is None:
+            selected = await _run(select_context, question, chunks, False)
+
+        context, prompt = await _run(_prompt, question, selected)
+
+        answer, cached = await generate_async(model, prompt, timeout)
+        await _run(
+            remember_answer, question, model, context, answer,
+            use_reranker, top_n, k_per_book, q_vec,
+        )
+        t.fields["cached"] = cached
+        return {
+            "question": question, "answer": answer, "chunks": context,
+            "cached": cached, "similar_to": None,
+        }
+
+
+def answer(question, **kwargs):
+    """
+    Blocking answer_question() for callers without an event loop.
+    """
+    return asyncio.run(answer_question(question, **kwargs))
+
+
+def sources(chunks):
+    """
+    Unique (book, chapter) pairs of the context, in order.
+    """
+    seen, out = set(), []
+    for c in chunks:
+        key = (c.get("book"), c.get("chapter"))
+        if key not in seen:
+            seen.add(key)
+            out.append({"book": key[0], "chapter": key[1]})
+    return out
@@ -1,12 +1,19 @@
-def build_prompt(question, chunks):
-    context = ""
-    for i, c in enumerate(chunks, 1):
-        context += (
-            f"[{i}] {c['book']} | {c['chapter']}\n"
-            f"{c['text']}\n\n"
-        )
-
-    return f"""
+import functools
+import os
+
+from common.tracing import timed
+
+# Bump when the template below changes so cached answers are invalidated.
+PROMPT_VERSION = 2
+
+# Upper bound on context tokens sent to the LLM (question and rules excluded).
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+
+# tiktoken encoding used to estimate token counts. Gemini's tokenizer
+# differs, but the estimate is close enough to enforce a budget.
+TOKENIZER = "cl100k_base"
+
+PROMPT_TEMPLATE = """
 You are a careful literary question-answering assistant for the Harry Potter books.
 
 Rules:
@@ -26,4 +33,147 @@ Context:
 {context}
 
 Answer:
-"""
\ No newline at end of file
+"""
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER)
+    except Exception:
+        # Not installed, or the BPE file can't be fetched offline.
+        return None
+
+
+def count_tokens(text):
+    """
+    Token count of text: tiktoken when available, else ~4 chars/token.
+    """
+    enc = _encoding()
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _row(chunk):
+    """
+    Row of the chunk within its book, from its "<book>#<row>" id.
+    """
+    _, _, row = str(chunk.get("id", "")).rpartition("#")
+    return int(row) if row.isdigit() else None
+
+
+def _overlap(left, right):
+    """
+    Length of the longest whole-sentence prefix of right that left ends
+    with (chunk_text repeats the last overlap_sents sentences).
+    """
+    if left.endswith(right):
+        return len(right)
+    k = right.rfind(" ", 0, len(left) + 1)
+    while k > 0:
+        if left.endswith(right[:k]):
+            return k
+        k = right.rfind(" ", 0, k)
+    return 0
+
+
+def _merge(texts):
+    merged = texts[0]
+    for text in texts[1:]:
+        rest = text[_overlap(merged, text):].strip()
+        if rest:
+            merged += " " + rest
+    return merged
+
+
+def pack_context(chunks, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Fit chunks (best first) into token_budget context tokens.
+
+    Chunks are taken in order while they fit, skipping duplicates.
+    Chunks that are neighbours in the same chapter are merged into one
+    excerpt, so the sentences their overlap repeats are counted and sent
+    once. The best chunk is always kept.
+
+    Returns excerpts as dicts with book, chapter, text and the ids of the
+    chunks they contain, ordered by their best chunk.
+    """
+    blocks = []        # {"book", "chapter", "rows": {row: text}, "ids"}, best first
+    by_chapter = {}    # (book, chapter) -> its blocks, best first
+    seen = set()
+    used = 0
+
+    for c in chunks:
+        text = c["text"].strip()
+        if not text or text in seen or c.get("id") in seen:
+            continue
+
+        key = (c.get("book"), c.get("chapter"))
+        row = _row(c)
+        neighbours = [] if row is None else [
+            b for b in by_chapter.get(key, [])
+            if row - 1 in b["rows"] or row + 1 in b["rows"]
+        ]
+
+        if neighbours:
+            rows = {r: t for b in neighbours for r, t in b["rows"].items()}
+            novel = text
+            if row - 1 in rows:
+                novel = novel[_overlap(rows[row - 1], novel):]
+            if row + 1 in rows:
+                novel = novel[:len(novel) - _overlap(novel, rows[row + 1])]
+            cost = count_tokens(novel)
+        else:
+            cost = count_tokens(text) + count_tokens(f"[0] {key[0]} | {key[1]}\n")
+
+        if blocks and used + cost > token_budget:
+            continue
+        used += cost
+        seen.add(text)
+        if c.get("id") is not None:
+            seen.add(c["id"])
+
+        if neighbours:
+            # The chunk can bridge two excerpts; fold the later into the earlier.
+            block = neighbours[0]
+            for other in neighbours[1:]:
+                block["rows"].update(other["rows"])
+                block["ids"].extend(other["ids"])
+                blocks.remove(other)
+                by_chapter[key].remove(other)
+        else:
+            block = {"book": key[0], "chapter": key[1], "rows": {}, "ids": []}
+            blocks.append(block)
+            if row is not None:
+                by_chapter.setdefault(key, []).append(block)
+        block["rows"][row] = text
+        block["ids"].append(c.get("id"))
+
+    return [
+        {
+            "book": b["book"],
+            "chapter": b["chapter"],
+            "text": _merge([b["rows"][r] for r in sorted(b["rows"], key=lambda r: r or 0)]),
+            "ids": b["ids"],
+        }
+        for b in blocks
+    ]
+
+
+@timed("build_prompt")
+def build_prompt(question, chunks, token_budget=CONTEXT_TOKEN_BUDGET, pack=True):
+    """
+    Prompt for question over chunks (best first). With pack=True the
+    chunks go through pack_context() first; pass pack=False for chunks
+    that already did.
+    """
+    if pack:
+        chunks = pack_context(chunks, token_budget)
+
+    context = "".join(
+        f"[{i}] {c['book']} | {c['chapter']}\n{c['text']}\n\n"
+        for i, c in enumerate(chunks, 1)
+    )
+    return PROMPT_TEMPLATE.format(question=question, context=context)
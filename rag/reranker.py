@@ -1,18 +1,149 @@
-from sentence_transformers import CrossEncoder
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from common.lazy import LazyModel
+from common.tracing import span, timed
+from ingestion.model_backend import load_model
+from rag.retriever import best_first
 
-reranker = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+reranker = LazyModel(RERANK_MODEL, lambda: load_model(RERANK_MODEL, "cross-encoder"))
+
+# Pairs are scored shortest-first, so each predict batch holds texts of
+# similar length and pads little. Bigger batches pay off with more cores.
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "0")) or min(
+    64, max(16, 8 * (os.cpu_count() or 1))
+)
+PAIR_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+# Early cutoff: only the RERANK_TOP_M candidates ranked best by the
+# first stage are scored (0 scores them all).
+RERANK_TOP_M = int(os.getenv("RERANK_TOP_M", "40"))
+
+
+class PairScoreCache:
+    """
+    LRU of cross-encoder scores keyed by (question hash, chunk text
+    hash). Keying on the text rather than the "book#row" id keeps scores
+    valid when a rebuilt, hot-reloaded index puts other text at a row.
+    """
+
+    def __init__(self, maxsize=PAIR_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys):
+        out = []
+        with self._lock:
+            for k in keys:
+                score = self._items.get(k)
+                if score is None:
+                    self.misses += 1
+                else:
+                    self._items.move_to_end(k)
+                    self.hits += 1
+                out.append(score)
+        return out
+
+    def put_many(self, items):
+        with self._lock:
+            for k, score in items:
+                self._items[k] = score
+                self._items.move_to_end(k)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
+
+
+pair_cache = PairScoreCache()
+
+
+def _question_hash(question):
+    return hashlib.sha1(" ".join(question.lower().split()).encode("utf-8")).hexdigest()
+
+
+def _text_hash(c):
+    return hashlib.sha1(c["text"].encode("utf-8")).hexdigest()
 
-def rerank(question, chunks, top_n=5):
-    if not chunks:
-        return chunks
 
-    pairs = [(question, c["text"]) for c in chunks]
-    scores = reranker.predict(pairs)
+def score_pairs(question, chunks):
+    """
+    Cross-encoder scores for (question, chunk) pairs, reusing cached
+    scores and length-bucketing the rest into CPU-sized batches.
+    """
+    return score_pairs_many([question], [chunks])[0]
 
+
+def score_pairs_many(questions, chunk_lists):
+    """
+    score_pairs() for several questions at once: the uncached pairs of
+    every question go through a single length-bucketed predict call.
+    """
+    keys = [
+        [(qh, _text_hash(c)) for c in chunks]
+        for qh, chunks in zip(map(_question_hash, questions), chunk_lists)
+    ]
+    scores = [pair_cache.get_many(k) for k in keys]
+
+    todo = [(q, i) for q, s in enumerate(scores) for i, v in enumerate(s) if v is None]
+    if todo:
+        todo.sort(key=lambda t: len(chunk_lists[t[0]][t[1]]["text"]))
+        pairs = [(questions[q], chunk_lists[q][i]["text"]) for q, i in todo]
+        model = reranker.get()
+        with span("rerank_predict"):
+            fresh = model.predict(pairs, batch_size=RERANK_BATCH_SIZE, show_progress_bar=False)
+
+        for (q, i), s in zip(todo, fresh):
+            scores[q][i] = float(s)
+        pair_cache.put_many((keys[q][i], scores[q][i]) for q, i in todo)
+
+    return scores
+
+
+def _cut(chunks, top_m):
+    if top_m and len(chunks) > top_m:
+        return best_first(chunks)[:top_m]
+    return chunks
+
+
+def _top(chunks, scores, top_n):
     ranked = sorted(
         zip(chunks, scores),
         key=lambda x: x[1],
         reverse=True
     )
 
-    return [c for c, _ in ranked[:top_n]]
\ No newline at end of file
+    return [c for c, _ in ranked[:top_n]]
+
+
+@timed("rerank")
+def rerank(question, chunks, top_n=5, top_m=None):
+    """
+    Order chunks by cross-encoder score and keep the best top_n.
+
+    top_m, if set, is an early cutoff: only the top_m chunks ranked best
+    by the first stage (fused RRF score, else FAISS distance) are scored.
+    """
+    if not chunks:
+        return chunks
+
+    chunks = _cut(chunks, top_m)
+    return _top(chunks, score_pairs(question, chunks), top_n)
+
+
+@timed("rerank_many")
+def rerank_many(questions, chunk_lists, top_n=5, top_m=None):
+    """
+    rerank() for each (question, chunks) pair, scoring all pairs in one
+    cross-encoder pass. Returns one top_n list per question.
+    """
+    chunk_lists = [_cut(chunks, top_m) for chunks in chunk_lists]
+    scores = score_pairs_many(questions, chunk_lists)
+    return [_top(chunks, s, top_n) for chunks, s in zip(chunk_lists, scores)]
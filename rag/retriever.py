@@ -1,69 +1,430 @@
-import os
-import pickle
-import faiss
 import numpy as np
-from ingestion.embeddings import embed
+try:
+    import faiss
+except ImportError:  # "numpy" indexes only
+    faiss = None
+from ingestion.embeddings import embed_queries, embed_query
+from ingestion.bm25 import tokenize, top_rows
+from ingestion.numpy_index import NumpyIndex
+from common.tracing import span, timed
+from rag.index_registry import VECTOR_BASE, get_registry
+from rag.router import ROUTING_ENABLED, route_books
 
-VECTOR_BASE = "vector_store"
+# How many candidates per book the unified search pulls before the
+# per-book top-k cut. Books still short after that get a filtered top-up.
+OVERSAMPLE = 4
 
+# Query-time knobs for approximate indexes (ignored for flat ones).
+NPROBE = 16
+EF_SEARCH = 64
 
-def retrieve(question: str, k_per_book: int = 12):
+# Reciprocal rank fusion constant: score = sum(1 / (RRF_K + rank)).
+RRF_K = 60
+
+
+def search_params(info, sel=None, nprobe=None, ef_search=None):
+    """
+    Per-query faiss SearchParameters for an index described by its
+    info.json. Returns None for a plain flat search.
+    """
+    index_type = info.get("index_type", "flat")
+    if index_type in ("ivf", "ivfpq"):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = min(nprobe or NPROBE, info.get("nlist", NPROBE))
+    elif index_type == "hnsw":
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search or EF_SEARCH
+    elif sel is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if sel is not None:
+        params.sel = sel
+    return params
+
+
+def _query(info, q_vec):
+    """
+    q_vec (one vector, or one per row) as the contiguous float32 (nq, d)
+    batch the index searches, rows unit-length when the index holds
+    normalized vectors.
+    """
+    q = np.array(q_vec, dtype="float32", ndmin=2, order="C")
+    if info.get("normalized"):
+        q /= np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+    return q
+
+
+def _search(entry, q_vec, k, id_range=None, nprobe=None, ef_search=None):
+    """
+    Top-k (distances, ids) for q_vec, one row per query vector,
+    optionally restricted to the row range id_range = (lo, hi).
+    Distances are always "smaller is closer": inner-product scores of
+    normalized indexes come back as the squared L2 distance 2 - 2 * ip.
+    """
+    q = _query(entry.info, q_vec)
+    if isinstance(entry.index, NumpyIndex):
+        with span("numpy_search"):
+            return entry.index.search(q, k, *(id_range or ()))
+
+    sel = faiss.IDSelectorRange(*id_range) if id_range else None
+    params = search_params(entry.info, sel, nprobe, ef_search)
+    with span("faiss_search"):
+        if params is None:
+            dists, ids = entry.index.search(q, k)
+        else:
+            dists, ids = entry.index.search(q, k, params=params)
+    if entry.info.get("metric") == "ip":
+        dists = 2.0 - 2.0 * dists
+    return dists, ids
+
+
+@timed("retrieve")
+def retrieve(question: str, k_per_book: int = 12, unified=None,
+             nprobe=None, ef_search=None, hybrid=True, route=None):
     """
     Balanced per-book retrieval:
     - Search each book independently
     - Take top-k from each book
     - Prevent early-book dominance
+
+    If a unified corpus index was built it is used instead of the
+    per-book indexes (one search instead of one per book). Pass
+    unified=False to force the per-book path.
+
+    nprobe / ef_search override the search breadth of IVF / HNSW
+    indexes for this query.
+
+    With hybrid=True (and a bm25.npz built next to the index), each
+    book's dense top-k is fused with its BM25 top-k by reciprocal rank
+    fusion. Chunks BM25 matched carry a "lexical_rank".
+
+    With route=True (default: QUERY_ROUTING), only the books the
+    centroid router picks are searched, or all of them when it is not
+    confident (see rag.router).
     """
-    q_vec = embed([question])[0]
+    q_vec = embed_query(question)
+    registry = get_registry(VECTOR_BASE)
+    route = ROUTING_ENABLED if route is None else route
+
+    if unified is not False:
+        corpus = registry.corpus()
+        if corpus is not None:
+            return retrieve_unified(
+                corpus, question, q_vec, k_per_book, nprobe, ef_search, hybrid, route
+            )
+        if unified:
+            raise FileNotFoundError("No unified corpus index in " + VECTOR_BASE)
+
+    books = registry.books()
+    if route:
+        books = routed(books, q_vec)
+
     all_chunks = []
 
-    for book_dir in os.listdir(VECTOR_BASE):
-        book_path = os.path.join(VECTOR_BASE, book_dir)
+    for book in books:
+        all_chunks.extend(
+            search_book(book, question, q_vec, k_per_book, nprobe, ef_search, hybrid)
+        )
 
-        index_path = os.path.join(book_path, "index.faiss")
-        meta_path = os.path.join(book_path, "meta.pkl")
+    return all_chunks
+
+
+@timed("retrieve_many")
+def retrieve_many(questions, k_per_book: int = 12, unified=None,
+                  nprobe=None, ef_search=None, hybrid=True, route=None):
+    """
+    retrieve() for a list of questions, returning one chunk list per
+    question. All questions are embedded in one batched pass and each
+    index is searched once with the matrix of query vectors (the
+    questions routed to it), so per-call overhead is paid per batch.
+    """
+    if not questions:
+        return []
+
+    q_vecs = embed_queries(list(questions))
+    registry = get_registry(VECTOR_BASE)
+    route = ROUTING_ENABLED if route is None else route
 
-        if not os.path.exists(index_path):
+    if unified is not False:
+        corpus = registry.corpus()
+        if corpus is not None:
+            book_ids = [_route_unified(corpus, v) if route else None for v in q_vecs]
+            results = _retrieve_unified_many(
+                corpus, q_vecs, k_per_book, nprobe, ef_search, book_ids
+            )
+            if hybrid and corpus.bm25 is not None:
+                results = [
+                    _fuse_unified(corpus, q, hits, k_per_book, b)
+                    for q, hits, b in zip(questions, results, book_ids)
+                ]
+            return results
+        if unified:
+            raise FileNotFoundError("No unified corpus index in " + VECTOR_BASE)
+
+    books = registry.books()
+    searched = [
+        {id(b) for b in (routed(books, v) if route else books)} for v in q_vecs
+    ]
+
+    results = [[] for _ in questions]
+    for book in books:
+        rows = [i for i, keep in enumerate(searched) if id(book) in keep]
+        if not rows:
             continue
+        hits = search_book_many(
+            book, [questions[i] for i in rows], q_vecs[rows],
+            k_per_book, nprobe, ef_search, hybrid,
+        )
+        for i, h in zip(rows, hits):
+            results[i].extend(h)
+    return results
 
-        index = faiss.read_index(index_path)
 
-        with open(meta_path, "rb") as f:
-            metadata = pickle.load(f)
+def routed(books, q_vec):
+    """
+    The BookIndexes the router picks for q_vec; all of them when
+    routing is not confident or a book has no centroids.
+    """
+    names = route_books(q_vec, [b.centroids for b in books])
+    if names is None:
+        return books
+    keep = set(names)
+    return [b for b in books if b.centroids.books[0] in keep]
 
-        _, ids = index.search(np.array([q_vec]), k_per_book)
 
-        for idx in ids[0]:
-            if idx < len(metadata):
-                all_chunks.append(metadata[idx])
+def search_book(book, question, q_vec, k_per_book=12, nprobe=None,
+                ef_search=None, hybrid=True):
+    """
+    One book's share of retrieve(): dense top-k, fused with BM25 when
+    hybrid and available. Safe to run concurrently for different books.
+    """
+    return search_book_many(book, [question], q_vec, k_per_book, nprobe, ef_search, hybrid)[0]
 
-    return all_chunks
+
+def search_book_many(book, questions, q_vecs, k_per_book=12, nprobe=None,
+                     ef_search=None, hybrid=True):
+    """
+    search_book() for several questions with one dense search over the
+    (nq, d) matrix q_vecs; returns one hit list per question.
+    """
+    metadata = book.metadata
+    dists, ids = _search(book, q_vecs, k_per_book, None, nprobe, ef_search)
+
+    results = []
+    for question, d_row, id_row in zip(questions, dists, ids):
+        hits = [
+            _hit(metadata[idx], idx, d)
+            for d, idx in zip(d_row, id_row)
+            if 0 <= idx < len(metadata)
+        ]
+        if hybrid and book.bm25 is not None:
+            with span("bm25"):
+                rows = book.bm25.search(question, k_per_book)
+            hits = rrf_fuse(hits, [_hit(metadata[r], r, None) for r in rows], k_per_book)
+        results.append(hits)
+    return results
+
+
+def retrieve_unified(corpus, question, q_vec, k_per_book=12, nprobe=None,
+                     ef_search=None, hybrid=True, route=False):
+    """
+    retrieve() over the unified corpus index. With route=True, routed
+    books are searched by id range instead of searching every row.
+    """
+    book_ids = _route_unified(corpus, q_vec) if route else None
+
+    hits = _retrieve_unified(corpus, q_vec, k_per_book, nprobe, ef_search, book_ids)
+    if hybrid and corpus.bm25 is not None:
+        hits = _fuse_unified(corpus, question, hits, k_per_book, book_ids)
+    return hits
 
 
+def _route_unified(corpus, q_vec):
+    """
+    Corpus book ids the router picks for q_vec, or None for all.
+    """
+    names = route_books(q_vec, [corpus.centroids])
+    if names is None:
+        return None
+    position = {name: b for b, name in enumerate(corpus.books)}
+    return [position[n] for n in names if n in position]
+
+
+def _hit(chunk, row, distance):
+    """
+    Copy of a chunk tagged with a stable id ("<book>#<row in book>",
+    the same under either index layout) and its search distance
+    (None for chunks only the lexical retriever found).
+    """
+    return dict(
+        chunk,
+        id=f"{chunk['book']}#{row}",
+        distance=None if distance is None else float(distance),
+    )
+
+
+def rrf_fuse(dense, lexical, k):
+    """
+    Reciprocal rank fusion of two best-first hit lists; returns the
+    top k, each tagged with its fused "rrf" score.
+    """
+    scores, hits = {}, {}
+    for rank, h in enumerate(dense, 1):
+        scores[h["id"]] = scores.get(h["id"], 0.0) + 1.0 / (RRF_K + rank)
+        hits[h["id"]] = h
+    for rank, h in enumerate(lexical, 1):
+        scores[h["id"]] = scores.get(h["id"], 0.0) + 1.0 / (RRF_K + rank)
+        hits[h["id"]] = dict(hits.get(h["id"], h), lexical_rank=rank)
+
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [dict(hits[i], rrf=scores[i]) for i in best]
+
+
+def _fuse_unified(corpus, question, hits, k_per_book, book_ids=None):
+    with span("bm25"):
+        scores = corpus.bm25.scores(question)
+
+    dense_by_book = {}
+    for h in hits:
+        dense_by_book.setdefault(h["book"], []).append(h)
+
+    fused = []
+    for b in range(len(corpus.books)) if book_ids is None else sorted(book_ids):
+        lo, hi = corpus.book_ranges[b]
+        rows = top_rows(scores[lo:hi], k_per_book) + lo
+        lexical = [_hit(corpus.metadata[r], r - lo, None) for r in rows.tolist()]
+        fused.extend(rrf_fuse(dense_by_book.get(corpus.books[b], []), lexical, k_per_book))
+    return fused
+
+
+def _top_k_per_book(book_ids, k_per_book):
+    """
+    Given candidate book ids in best-first order, return the positions
+    of the first k_per_book candidates of each book, grouped by book
+    (best-first inside each group).
+    """
+    order = np.argsort(book_ids, kind="stable")
+    grouped = book_ids[order]
+    group_start = np.searchsorted(grouped, grouped, side="left")
+    rank = np.arange(len(order)) - group_start
+    return order[rank < k_per_book]
+
+
+def _retrieve_unified(corpus, q_vec, k_per_book, nprobe=None, ef_search=None, book_ids=None):
+    return _retrieve_unified_many(
+        corpus, np.asarray([q_vec]), k_per_book, nprobe, ef_search, [book_ids]
+    )[0]
+
+
+def _retrieve_unified_many(corpus, q_vecs, k_per_book, nprobe=None, ef_search=None,
+                           book_ids=None):
+    """
+    Balanced top-k per book for each row of q_vecs over the corpus
+    index. book_ids[i] restricts query i to the routed books (None: all).
+    Unrouted queries share one oversampled search; top-ups share one
+    id-range search per book.
+    """
+    index = corpus.index
+    n_books = len(corpus.books)
+    nq = len(q_vecs)
+    book_ids = book_ids or [None] * nq
+
+    distance = [{} for _ in range(nq)]
+    picked = [np.empty(0, dtype="int64") for _ in range(nq)]
+
+    # Routed queries skip this: only their books' id ranges are searched, below.
+    full = [i for i in range(nq) if book_ids[i] is None]
+    if full:
+        k = min(index.ntotal, k_per_book * n_books * OVERSAMPLE)
+        dists, ids = _search(corpus, q_vecs[full], k, None, nprobe, ef_search)
+        for row, i in enumerate(full):
+            keep = ids[row] >= 0
+            found = ids[row][keep]
+            distance[i] = dict(zip(found.tolist(), dists[row][keep].tolist()))
+            picked[i] = found[_top_k_per_book(corpus.book_ids[found], k_per_book)]
+
+    # A book whose chunks are all far from the query can fall out of the
+    # oversampled window; search just its id range to keep retrieval balanced.
+    short = {}
+    for i in range(nq):
+        books = range(n_books) if book_ids[i] is None else sorted(book_ids[i])
+        counts = np.bincount(corpus.book_ids[picked[i]], minlength=n_books)
+        for b in books:
+            lo, hi = corpus.book_ranges[b]
+            if counts[b] < min(k_per_book, hi - lo):
+                short.setdefault(b, []).append(i)
+
+    for b, rows in short.items():
+        lo, hi = corpus.book_ranges[b]
+        extra_d, extra = _search(corpus, q_vecs[rows], k_per_book, (lo, hi), nprobe, ef_search)
+        for row, i in enumerate(rows):
+            keep = extra[row] >= 0
+            found = extra[row][keep]
+            distance[i].update(zip(found.tolist(), extra_d[row][keep].tolist()))
+            picked[i] = np.concatenate([picked[i][corpus.book_ids[picked[i]] != b], found])
+
+    results = []
+    for i in range(nq):
+        rows = picked[i][np.argsort(corpus.book_ids[picked[i]], kind="stable")]
+        results.append([
+            _hit(corpus.metadata[r], r - corpus.book_ranges[corpus.book_ids[r]][0], distance[i][r])
+            for r in rows.tolist()
+        ])
+    return results
+
+
+def best_first(chunks):
+    """
+    Chunks from every book in one first-stage order: fused RRF score
+    when all have one, else FAISS distance, else as given.
+    """
+    if all("rrf" in c for c in chunks):
+        return sorted(chunks, key=lambda c: -c["rrf"])
+    if all(c.get("distance") is not None for c in chunks):
+        return sorted(chunks, key=lambda c: c["distance"])
+    return list(chunks)
+
+
+@timed("filter_chunks")
 def filter_chunks(question: str, chunks: list):
     """
     Light lexical relevance filter to remove noisy early-book chunks
     while keeping a safe fallback.
+
+    After hybrid retrieval the fused top-k is kept as is (RRF already
+    weighed the lexical match, and dropping dense-only hits would undo
+    the fusion); otherwise it keeps chunks sharing a content term with
+    the question.
     """
-    q = question.lower()
-
-    KEYWORDS = [
-        "horcrux",
-        "soul",
-        "slughorn",
-        "voldemort",
-        "deathly",
-        "hallow",
-        "elder wand",
-        "resurrection stone",
-        "invisibility cloak",
-    ]
+    return _filter(question, chunks, lambda c: set(tokenize(c.get("text", ""))))
+
+
+@timed("filter_chunks_many")
+def filter_chunks_many(questions, chunk_lists):
+    """
+    filter_chunks() for each (question, chunks) pair. Chunks shared
+    between questions (the usual case in a batch) are tokenized once.
+    """
+    terms_of = {}
+
+    def chunk_terms(c):
+        key = c.get("id") or c.get("text", "")
+        terms = terms_of.get(key)
+        if terms is None:
+            terms = terms_of[key] = set(tokenize(c.get("text", "")))
+        return terms
+
+    return [_filter(q, chunks, chunk_terms) for q, chunks in zip(questions, chunk_lists)]
+
+
+def _filter(question, chunks, chunk_terms):
+    if any("rrf" in c for c in chunks):
+        return chunks
 
-    filtered = []
-    for c in chunks:
-        text = c.get("text", "").lower()
-        if any(k in text for k in KEYWORDS if k in q):
-            filtered.append(c)
+    terms = set(tokenize(question))
+    filtered = [c for c in chunks if terms & chunk_terms(c)]
 
     # Fallback: if filtering removes everything, return original chunks
-    return filtered if filtered else chunks
\ No newline at end of file
+    return filtered if filtered else chunks
@@ -0,0 +1,86 @@
+"""
+Query routing: pick the books worth searching for a question from the
+per-book and per-chapter centroids written at ingestion
+(ingestion.centroids), so retrieval searches O(relevant books) instead
+of every book.
+
+A book is routed to when one of its chapters is within ROUTE_MARGIN of
+the best-matching chapter overall, or its book centroid is within
+ROUTE_BOOK_MARGIN of the best book. When the best chapter match is
+weak (< ROUTE_MIN_SIM) or too many books qualify (> ROUTE_MAX_BOOKS),
+routing is not confident and every book is searched.
+
+Routing is off unless QUERY_ROUTING=1: it trades the balanced per-book
+retrieval for speed, and the thresholds below are starting points, not
+values tuned against the golden set (benchmarks.bench_retrieval --route).
+"""
+import os
+import threading
+
+import numpy as np
+
+from common.tracing import current_trace, timed
+
+ROUTING_ENABLED = os.getenv("QUERY_ROUTING", "0") == "1"
+ROUTE_MIN_SIM = float(os.getenv("ROUTE_MIN_SIM", "0.3"))
+ROUTE_MARGIN = float(os.getenv("ROUTE_MARGIN", "0.05"))
+ROUTE_BOOK_MARGIN = float(os.getenv("ROUTE_BOOK_MARGIN", "0.02"))
+ROUTE_MAX_BOOKS = int(os.getenv("ROUTE_MAX_BOOKS", "3"))
+
+_stats = {"routed": 0, "fallback": 0, "unavailable": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def route_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+@timed("route")
+def route_books(q_vec, centroid_sets):
+    """
+    Names of the books to search for q_vec, best first, or None to
+    search everything. centroid_sets are the Centroids of the indexes
+    that could be searched; any missing (None) disables routing.
+    """
+    if not centroid_sets or any(c is None for c in centroid_sets):
+        _count("unavailable")
+        return None
+
+    q = np.asarray(q_vec, dtype="float32").ravel()
+    q = q / max(float(np.linalg.norm(q)), 1e-12)
+
+    books, book_sims, chapter_best = [], [], []
+    for c in centroid_sets:
+        ch_sims = c.chapter_centroids @ q
+        b_sims = c.book_centroids @ q
+        for b, name in enumerate(c.books):
+            mine = ch_sims[c.chapter_book == b]
+            books.append(name)
+            book_sims.append(float(b_sims[b]))
+            chapter_best.append(float(mine.max()) if len(mine) else float(b_sims[b]))
+
+    book_sims = np.asarray(book_sims)
+    chapter_best = np.asarray(chapter_best)
+    best = chapter_best.max()
+
+    chosen = np.flatnonzero(
+        (chapter_best >= best - ROUTE_MARGIN)
+        | (book_sims >= book_sims.max() - ROUTE_BOOK_MARGIN)
+    )
+    if best < ROUTE_MIN_SIM or len(chosen) > ROUTE_MAX_BOOKS or len(chosen) == len(books):
+        _count("fallback")
+        return None
+
+    chosen = chosen[np.argsort(-chapter_best[chosen], kind="stable")]
+    routed = [books[i] for i in chosen]
+    _count("routed")
+    trace = current_trace()
+    if trace is not None:
+        trace.fields["routed_books"] = routed
+    return routed
@@ -0,0 +1,116 @@
+"""
+Near-duplicate question cache.
+
+Past questions are kept as normalized query embeddings in a small
+in-memory FAISS inner-product index, each mapped to the excerpts it was
+answered from and the final answer. A new question whose cosine
+similarity to a cached one is at least SEMANTIC_CACHE_THRESHOLD reuses
+that answer, skipping retrieval, reranking and the LLM call.
+
+Entries are namespaced (model, prompt version, retrieval settings) so
+an answer is only reused under the settings that produced it.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# Needs FAISS for its index; off in NumPy-only environments.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "1") != "0" and faiss is not None
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+
+# Neighbours checked per lookup, in case the nearest is in another namespace.
+SEARCH_K = 4
+
+
+def _unit(vec):
+    v = np.asarray(vec, dtype="float32").reshape(1, -1).copy()
+    faiss.normalize_L2(v)
+    return v
+
+
+class SemanticCache:
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, maxsize=SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._index = None
+        self._entries = OrderedDict()  # id -> entry, least recently used first
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, q_vec, namespace):
+        """
+        The cached entry closest to q_vec in namespace if it clears the
+        threshold, else None. Entries are dicts with question, answer,
+        chunks, chunk_ids and the similarity of this match.
+        """
+        q = _unit(q_vec)
+        with self._lock:
+            if self._index is not None and self._index.ntotal:
+                sims, ids = self._index.search(q, min(SEARCH_K, self._index.ntotal))
+                for sim, i in zip(sims[0], ids[0]):
+                    if sim < self.threshold:
+                        break
+                    entry = self._entries.get(int(i))
+                    if entry is not None and entry["namespace"] == namespace:
+                        self._entries.move_to_end(int(i))
+                        self.hits += 1
+                        return dict(entry, similarity=float(sim))
+            self.misses += 1
+            return None
+
+    def put(self, q_vec, namespace, question, answer, chunks):
+        q = _unit(q_vec)
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(q.shape[1]))
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(q, np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = {
+                "namespace": namespace,
+                "question": question,
+                "answer": answer,
+                "chunks": chunks,
+                "chunk_ids": [i for c in chunks for i in c.get("ids", [c.get("id")])],
+                "created": time.time(),
+            }
+
+            evicted = []
+            while len(self._entries) > self.maxsize:
+                old_id, _ = self._entries.popitem(last=False)
+                evicted.append(old_id)
+            if evicted:
+                self._index.remove_ids(np.array(evicted, dtype="int64"))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,143 @@
+"""
+Minimal HTTP front end for the pipeline (stdlib only).
+
+    POST /ask      {"question": "...", "use_reranker": true, "top_n": 5}
+    GET  /healthz  model warm-up status
+    GET  /metrics  per-stage latency, Prometheus text format
+
+Requests are handled on threads but all run on one background event
+loop, so the LLM concurrency limit and answer cache are shared.
+
+    python -m rag.server --port 8000
+    python -m rag.server --stub          # no Gemini key / network needed
+"""
+import argparse
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common.lazy import startup_report, warm_up
+from common.tracing import prometheus_text
+from rag.gemini_client import get_client
+from rag.pipeline import LLM_TIMEOUT_S, answer_question, sources
+from rag.semantic_cache import semantic_cache
+
+MAX_BODY = 64 * 1024
+
+
+class PipelineRunner:
+    """
+    Owns the event loop answer_question() runs on.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="rag-loop", daemon=True)
+        self._thread.start()
+
+    def ask(self, question, **kwargs):
+        future = asyncio.run_coroutine_threadsafe(
+            answer_question(question, model=self.model, **kwargs), self.loop
+        )
+        return future.result()
+
+
+def make_handler(runner):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                self._send(200, {
+                    "status": "ok",
+                    "models": startup_report(),
+                    "semantic_cache": semantic_cache.stats(),
+                })
+            elif self.path == "/metrics":
+                body = prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/ask":
+                self._send(404, {"error": "not found"})
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY:
+                self._send(413, {"error": "request too large"})
+                return
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+                question = str(body["question"]).strip()
+            except (ValueError, KeyError, TypeError):
+                self._send(400, {"error": 'expected JSON body {"question": "..."}'})
+                return
+            if not question:
+                self._send(400, {"error": "empty question"})
+                return
+            use_reranker = body.get("use_reranker", True)
+            if not isinstance(use_reranker, bool):
+                self._send(400, {"error": "use_reranker must be true or false"})
+                return
+            top_n = body.get("top_n", 5)
+            if isinstance(top_n, bool) or not isinstance(top_n, int) or top_n < 1:
+                self._send(400, {"error": "top_n must be a positive integer"})
+                return
+
+            try:
+                result = runner.ask(question, use_reranker=use_reranker, top_n=top_n)
+            except asyncio.TimeoutError:
+                self._send(504, {"error": f"LLM timed out after {LLM_TIMEOUT_S:.0f}s"})
+                return
+            except Exception as e:
+                self._send(500, {"error": str(e)})
+                return
+
+            self._send(200, {
+                "question": question,
+                "answer": result["answer"],
+                "sources": sources(result["chunks"]),
+                "cached": result["cached"],
+                "similar_to": result["similar_to"],
+            })
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the RAG pipeline over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stub", action="store_true", help="Use the offline stub LLM")
+    args = parser.parse_args()
+
+    warm_up()
+    runner = PipelineRunner(get_client("stub" if args.stub else None))
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(runner))
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Offline stand-in for the Gemini GenerativeModel.
+
+Implements the subset of the API the pipeline uses (generate_content,
+with and without stream=True, and generate_content_async) and answers
+by quoting the first excerpt of the prompt's context. Use it to run the
+server, batch jobs or benchmarks without an API key or network.
+"""
+import asyncio
+import re
+
+STUB_MODEL_NAME = "stub"
+
+_EXCERPT_RE = re.compile(r"^\[1\] (.+)\n(.+)$", re.MULTILINE)
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    model_name = STUB_MODEL_NAME
+
+    def __init__(self, latency_s=0.0):
+        self.latency_s = latency_s
+
+    def _answer(self, prompt):
+        m = _EXCERPT_RE.search(prompt)
+        if not m:
+            return "Not found in the book."
+        source, text = m.groups()
+        return f"{text[:300]} ({source})"
+
+    def generate_content(self, prompt, stream=False):
+        answer = self._answer(prompt)
+        if stream:
+            return [_Response(w + " ") for w in answer.split(" ")]
+        return _Response(answer)
+
+    async def generate_content_async(self, prompt):
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return _Response(self._answer(prompt))
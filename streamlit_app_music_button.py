@@ -1,12 +1,16 @@
 import streamlit as st
-import base64
 import time
 from dotenv import load_dotenv
 
-from rag.retriever import retrieve, filter_chunks
-from rag.reranker import rerank
-from rag.prompt import build_prompt
+from rag.pipeline import build_context, lookup_answer, remember_answer, sources
+from rag.semantic_cache import semantic_cache
 from rag.gemini_client import get_client
+from rag.answer_cache import stream_answer
+from common.lazy import startup_report, warm_up
+from common.tracing import latency_stats, trace
+from ingestion.embeddings import embedder
+from rag.reranker import reranker
+from ui_assets import answer_card, asset_type, asset_url
 
 # -------------------------------------------------
 # 1. Config
@@ -14,6 +18,31 @@ from rag.gemini_client import get_client
 st.set_page_config(page_title="🧙 Harry Potter RAG", layout="wide")
 load_dotenv()
 
+# Models load in a background thread (once per process) so the page
+# renders right away; the first query waits on whatever is still loading.
+MODELS = [embedder, reranker]
+warm_up(MODELS)
+
+with st.sidebar.expander("⏱️ Model warm-up"):
+    for r in startup_report(MODELS):
+        status = f"ready in {r['load_s']}s" if r["loaded"] else "loading…"
+        st.caption(f"{r['model']}: {status}")
+
+with st.sidebar.expander("📈 Latency (ms)"):
+    stats = latency_stats()
+    if stats:
+        st.table({
+            stage: dict(
+                {k[:-2]: round(v * 1000, 1) for k, v in s.items() if k.startswith("p")},
+                count=s["count"],
+            )
+            for stage, s in stats.items()
+        })
+    else:
+        st.caption("No queries yet.")
+    sc = semantic_cache.stats()
+    st.caption(f"Semantic cache: {sc['hits']} hits / {sc['hits'] + sc['misses']} lookups, {sc['size']} entries")
+
 # -------------------------------------------------
 # 2. Session State
 # -------------------------------------------------
@@ -33,74 +62,67 @@ spell_placeholder = st.empty()
 # -------------------------------------------------
 # 3. Background
 # -------------------------------------------------
-def set_background(path):
-    try:
-        with open(path, "rb") as f:
-            img = base64.b64encode(f.read()).decode()
-
-        st.markdown(
-            f"""
-            <style>
-            .stApp {{
-                background:
-                  linear-gradient(rgba(0,0,0,0.6), rgba(0,0,0,0.85)),
-                  url("data:image/jpeg;base64,{img}");
-                background-size: cover;
-                background-position: center;
-                background-attachment: fixed;
-            }}
-            </style>
-            """,
-            unsafe_allow_html=True
-        )
-    except:
-        pass
-
-set_background("assets/background.jpeg")
+def set_background(name):
+    url = asset_url(name)
+    if url is None:
+        return
+
+    st.markdown(
+        f"""
+        <style>
+        .stApp {{
+            background:
+              linear-gradient(rgba(0,0,0,0.6), rgba(0,0,0,0.85)),
+              url("{url}");
+            background-size: cover;
+            background-position: center;
+            background-attachment: fixed;
+        }}
+        </style>
+        """,
+        unsafe_allow_html=True
+    )
+
+set_background("background.jpeg")
 
 # -------------------------------------------------
 # 4. Background Music (DEPLOYMENT SAFE)
 # -------------------------------------------------
 def background_music():
-    try:
-        with open("assets/Hedwig.mp3", "rb") as f:
-            audio = base64.b64encode(f.read()).decode()
-
-        st.markdown(
-            f"""
-            <audio autoplay loop>
-                <source src="data:audio/mp3;base64,{audio}" type="audio/mp3">
-            </audio>
-            """,
-            unsafe_allow_html=True
-        )
-    except:
-        pass
+    url = asset_url("Hedwig.mp3")
+    if url is None:
+        return
+
+    st.markdown(
+        f"""
+        <audio autoplay loop>
+            <source src="{url}" type="{asset_type('Hedwig.mp3')}">
+        </audio>
+        """,
+        unsafe_allow_html=True
+    )
 
 # -------------------------------------------------
 # 5. Spell Sound (Plays EVERY answer)
 # -------------------------------------------------
 def play_spell_sound():
-    spell_placeholder.empty()
-    time.sleep(0.05)
-
-    try:
-        with open("assets/Spell.mp3", "rb") as f:
-            audio = base64.b64encode(f.read()).decode()
+    url = asset_url("Spell.mp3")
+    if url is None:
+        return
 
-        unique_id = f"spell_{time.time()}"
+    # The unique id changes the element on every answer, so the browser
+    # mounts a fresh <audio> and autoplays it again.
+    unique_id = f"spell_{time.time()}"
 
-        spell_placeholder.markdown(
-            f"""
-            <audio autoplay>
-                <source src="data:audio/mp3;base64,{audio}" type="audio/mp3">
-            </audio>
-            <div style="display:none">{unique_id}</div>
-            """,
-            unsafe_allow_html=True
-        )
-    except:
-        pass
+    spell_placeholder.markdown(
+        f"""
+        <audio autoplay>
+            <source src="{url}" type="{asset_type('Spell.mp3')}">
+        </audio>
+        <div style="display:none">{unique_id}</div>
+        """,
+        unsafe_allow_html=True
+    )
 
 # -------------------------------------------------
 # 6. Header
@@ -150,25 +172,51 @@ if not question:
 # 9. RAG Pipeline
 # -------------------------------------------------
 if question:
-    with st.spinner("🔍 Searching the books..."):
-        chunks = retrieve(question)
-        chunks = rerank(question, chunks)
-        #chunks = filter_chunks(question, chunks)
-
-    if not chunks:
-        st.warning("No relevant context found.")
-        st.stop()
-
-    prompt = build_prompt(question, chunks)
-
-    with st.spinner("🧠 Thinking with Gemini..."):
-        try:
-            # ✅ CORRECT Gemini call
-            response = model.generate_content(prompt)
-            answer = response.text.strip()
-        except Exception as e:
-            st.error(f"Gemini error: {e}")
-            st.stop()
+    with trace("streamlit_query", question=question) as t:
+        hit = lookup_answer(question, model, use_reranker=True)
+        if hit is not None:
+            # A near-duplicate was answered before: no retrieval or Gemini call
+            chunks, answer = hit["chunks"], hit["answer"]
+            timings = {"cached": True, "similar_to": hit["question"]}
+            st.markdown("## 📜 Answer")
+            answer_box = st.empty()
+        else:
+            with st.spinner("🔍 Searching the books..."):
+                chunks, prompt = build_context(question, use_reranker=True)
+
+            if not chunks:
+                st.warning("No relevant context found.")
+                st.stop()
+
+            # -------------------------------------------------
+            # Answer (streamed into the card as Gemini generates it)
+            # -------------------------------------------------
+            st.markdown("## 📜 Answer")
+            answer_box = st.empty()
+            answer_box.markdown(answer_card("🧠 Thinking with Gemini..."), unsafe_allow_html=True)
+
+            answer = ""
+            timings = {}
+            try:
+                for piece in stream_answer(model, prompt, timings):
+                    answer += piece
+                    answer_box.markdown(answer_card(answer), unsafe_allow_html=True)
+            except Exception as e:
+                answer_box.empty()
+                st.error(f"Gemini error: {e}")
+                st.stop()
+
+            answer = answer.strip()
+            remember_answer(question, model, chunks, answer, use_reranker=True)
+        t.fields["cached"] = bool(timings.get("cached"))
+
+    answer_box.markdown(answer_card(answer), unsafe_allow_html=True)
+    if timings.get("similar_to") and timings["similar_to"] != question:
+        st.caption(f"⚡ Answered from cache (same as “{timings['similar_to']}”)")
+    elif timings.get("cached"):
+        st.caption("⚡ Answered from cache")
+    elif timings.get("ttft_s") is not None:
+        st.caption(f"⚡ First token {timings['ttft_s']:.2f}s · total {timings['total_s']:.2f}s")
 
     # 🔊 Spell sound ON ANSWER
     play_spell_sound()
@@ -178,37 +226,13 @@ if question:
         st.session_state.recent_queries.insert(0, question)
         st.session_state.recent_queries = st.session_state.recent_queries[:3]
 
-    # -------------------------------------------------
-    # Answer
-    # -------------------------------------------------
-    st.markdown("## 📜 Answer")
-    st.markdown(
-        f"""
-        <div style="
-            background: rgba(255,248,230,0.95);
-            padding: 25px;
-            border-radius: 15px;
-            font-family: serif;
-            font-size: 18px;
-            color: #3a2c1a;">
-            {answer}
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-
     # -------------------------------------------------
     # Sources
     #--------------------------------------------------
     with st.expander("📚 Sources used"):
-        seen = set()
-        for c in chunks:
-            key = (c.get("book"), c.get("chapter"))
-            if key in seen:
-                continue
-            seen.add(key)
+        for src in sources(chunks):
             st.markdown(
-                f"**{c.get('book','Unknown Book')}**  \n{c.get('chapter','Unknown Chapter')}"
+                f"**{src['book'] or 'Unknown Book'}**  \n{src['chapter'] or 'Unknown Chapter'}"
             )
 
 # -------------------------------------------------
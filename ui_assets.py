@@ -0,0 +1,79 @@
+"""
+Front-end assets (background image, music, spell sound) as small
+references instead of inline payloads.
+
+With server.enableStaticServing (set in .streamlit/config.toml) the
+images in static/ are served by Streamlit at app/static/<name> and
+cached by the browser, so a rerun only sends their URL. Everything else
+(audio, or any asset when static serving is off) is base64-encoded once
+per process and the data URI reused.
+
+static/ holds real copies, not symlinks: Streamlit refuses files that
+resolve outside static/, and serves types outside STATIC_TYPES as
+text/plain, which browsers won't play.
+
+Also holds the HTML shared by both apps (answer_card).
+"""
+import base64
+import functools
+import mimetypes
+import os
+
+import streamlit as st
+
+ASSETS_DIR = "assets"
+STATIC_DIR = "static"
+STATIC_URL = "app/static"
+# Extensions Streamlit's static handler serves with their real MIME type.
+STATIC_TYPES = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+
+
+def _static_serving():
+    try:
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def _data_uri(path, mtime):
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode()}"
+
+
+def asset_url(name):
+    """
+    URL for the asset called name, or None if it doesn't exist.
+    """
+    if (
+        name.lower().endswith(STATIC_TYPES)
+        and _static_serving()
+        and os.path.exists(os.path.join(STATIC_DIR, name))
+    ):
+        return f"{STATIC_URL}/{name}"
+
+    path = os.path.join(ASSETS_DIR, name)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    return _data_uri(path, mtime)
+
+
+def asset_type(name):
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def answer_card(answer):
+    return f"""
+        <div style="
+            background: rgba(255,248,230,0.95);
+            padding: 25px;
+            border-radius: 15px;
+            font-family: serif;
+            font-size: 18px;
+            color: #3a2c1a;">
+            {answer}
+        </div>
+        """